@@ -1,57 +1,349 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from dataclasses import dataclass
-from typing import List, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
+import json
+import math
+import os
+import re
+import threading
+import time
+
+# Para reduzir o cold start, módulos usados só em alguns caminhos (compressão,
+# ETag, profiler) são importados sob demanda dentro das funções
+brotli = False  # False: ainda não tentou importar; None: indisponível
+
+def load_brotli():
+    global brotli
+    if brotli is False:
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+    return brotli
+
+class Pace(int):
+    # Pace em segundos por km; só vira texto "M:SS" na serialização
+    __slots__ = ()
+
+    def __add__(self, seconds: int) -> 'Pace':
+        return Pace(int(self) + seconds)
+
+    def __sub__(self, seconds: int) -> 'Pace':
+        return Pace(int(self) - seconds)
+
+    def __str__(self) -> str:
+        return f"{self // 60}:{self % 60:02d}"
+
+    def __format__(self, spec: str) -> str:
+        return format(str(self), spec)
+
+class PaceRange:
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start: Pace, end: Pace):
+        self.start = start
+        self.end = end
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PaceRange) and (self.start, self.end) == (other.start, other.end)
+
+    def __hash__(self) -> int:
+        return hash((self.start, self.end))
+
+    def __repr__(self) -> str:
+        return f"PaceRange({int(self.start)}, {int(self.end)})"
+
+    def __str__(self) -> str:
+        return f"{self.start} a {self.end} min/km"
+
+class PlanJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, PaceRange):
+            return str(o)
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
-CORS(app)
+app.json = PlanJSONProvider(app)
+# O esquema v4 mantém a política original: só o frontend local, com credenciais
+CORS(app, resources={
+    r"/v4/*": {"origins": "http://localhost:3000", "supports_credentials": True},
+    r"/*": {"origins": "*"}
+})
+# Atrás de proxies reversos, PROXY_FIX_HOPS diz quantos deles acrescentam
+# X-Forwarded-For; só esses saltos são aceitos como endereço do cliente
+PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+if PROXY_FIX_HOPS > 0:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_HOPS, x_proto=PROXY_FIX_HOPS)
+
+# Instrumentação: tempo por etapa de cada requisição (Server-Timing) e
+# histogramas agregados no formato texto do Prometheus (/metrics)
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, label: Optional[str] = None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str = ''):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, (counts, count, total) in sorted(self._series.items()):
+                labels = f'{self.label}="{label_value}",' if self.label else ''
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {count}')
+                suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+                lines.append(f"{self.name}_sum{suffix} {total}")
+                lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+STAGE_SECONDS = Histogram('plan_stage_duration_seconds', "Tempo gasto em cada etapa da requisição",
+                          (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5), label='stage')
+PLAN_WEEKS = Histogram('plan_weeks', "Semanas por plano gerado", (1, 4, 6, 12, 26, 52, 104, 260, 520))
+PLAN_SESSIONS = Histogram('plan_sessions', "Sessões por plano gerado", (4, 16, 24, 48, 104, 208, 416, 1040, 2080))
+RESPONSE_BYTES = Histogram('plan_response_bytes', "Tamanho do corpo das respostas",
+                           (1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+class StageTimings:
+    __slots__ = ('stages', 'started', 'profiler')
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.profiler = None
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def call(self, stage: str, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+instrumentation = threading.local()
+
+def request_timings() -> Optional[StageTimings]:
+    return getattr(instrumentation, 'timings', None)
+
+@contextmanager
+def timed(stage: str):
+    timings = request_timings()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - start)
+
+def timed_iter(stage: str, iterable):
+    # timed para geradores consumidos em streaming: só o tempo de cada
+    # next() conta na etapa, não o de quem consome os itens
+    iterator = iter(iterable)
+    while True:
+        with timed(stage):
+            item = next(iterator, timed_iter)
+        if item is timed_iter:
+            return
+        yield item
 
-@dataclass
+def observe_plan_size(num_weeks: int):
+    PLAN_WEEKS.observe(num_weeks)
+    PLAN_SESSIONS.observe(num_weeks * 4)
+
+@app.before_request
+def start_timings():
+    timings = instrumentation.timings = StageTimings()
+    if PROFILE_SAMPLE_RATE:
+        import cProfile
+        import random
+        if random.random() >= PROFILE_SAMPLE_RATE:
+            return
+        timings.profiler = cProfile.Profile()
+        timings.profiler.enable()
+
+def finish_timings(timings: StageTimings, label: str):
+    # Para o perfilador e registra as etapas nos histogramas
+    if timings.profiler is not None:
+        timings.profiler.disable()
+        import io
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(timings.profiler, stream=output).sort_stats('cumulative').print_stats(20)
+        app.logger.info("Perfil de %s\n%s", label, output.getvalue())
+
+    timings.add('total', time.perf_counter() - timings.started)
+    for stage, seconds in timings.stages.items():
+        STAGE_SECONDS.observe(seconds, stage)
+
+@app.after_request
+def record_timings(response):
+    timings = request_timings()
+    if timings is None:
+        return response
+    # O Server-Timing só leva as etapas concluídas antes do corpo
+    response.headers['Server-Timing'] = ', '.join(
+        f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in
+        {**timings.stages, 'total': time.perf_counter() - timings.started}.items()
+    )
+    label = f"{request.method} {request.path}"
+    if response.is_streamed:
+        # Em streaming a geração acontece enquanto o corpo é enviado
+        response.call_on_close(lambda: finish_timings(timings, label))
+    else:
+        finish_timings(timings, label)
+        RESPONSE_BYTES.observe(response.calculate_content_length() or 0)
+    return response
+
+@app.teardown_request
+def clear_timings(exc):
+    instrumentation.timings = None
+
+# Gravação opcional dos pedidos de /calculate para reprodução com o
+# loadtest.py: RECORD_REQUESTS é o arquivo JSONL de saída e
+# RECORD_SAMPLE_RATE a fração dos pedidos gravados
+RECORD_REQUESTS = os.environ.get('RECORD_REQUESTS')
+RECORD_SAMPLE_RATE = float(os.environ.get('RECORD_SAMPLE_RATE', 1))
+RECORDED_ENDPOINTS = {'calculate', 'calculate_v4'}
+record_file = None
+record_lock = threading.Lock()
+
+@app.before_request
+def record_request():
+    global record_file
+    if not RECORD_REQUESTS or request.method == 'OPTIONS' or request.endpoint not in RECORDED_ENDPOINTS:
+        return
+    if RECORD_SAMPLE_RATE < 1:
+        import random
+        if random.random() >= RECORD_SAMPLE_RATE:
+            return
+    line = json.dumps({
+        'ts': time.time(),
+        'method': request.method,
+        'path': request.path,
+        'query': request.query_string.decode(),
+        'accept': request.headers.get('Accept'),
+        # Corpo bruto, como chegou: um JSON inválido precisa dar o mesmo 400 na reprodução
+        'content_type': request.content_type,
+        'body': request.get_data(as_text=True) or None
+    }, separators=(',', ':'))
+    with record_lock:
+        if record_file is None:
+            record_file = open(RECORD_REQUESTS, 'a', buffering=1)
+        record_file.write(line + "\n")
+
+# Nós imutáveis e sem __dict__: os nós constantes (aquecer, descansar,
+# desaquecer) são compartilhados entre todas as sessões
+@dataclass(frozen=True, slots=True)
 class Activity:
     description: str
     distance: Optional[str] = None
     duration: Optional[str] = None
-    pace: Optional[str] = None
+    pace: Optional[PaceRange] = None
     intensity: Optional[str] = None
     repetitions: Optional[int] = None
-    activities: Optional[List['Activity']] = None
+    activities: Tuple['Activity', ...] = ()
+    # Carga numérica, preenchida na construção do nó: km e minutos já
+    # incluem as repetições; zones é ((zona de pace, km), ...). Derivada dos
+    # campos acima, fica fora da comparação (o delta do replan usa ==)
+    km: float = field(default=0.0, compare=False)
+    minutes: float = field(default=0.0, compare=False)
+    zones: Tuple[Tuple[str, float], ...] = field(default=(), compare=False)
 
-    def __post_init__(self):
-        if self.activities is None:
-            self.activities = []
+@dataclass(frozen=True, slots=True)
+class SessionLoad:
+    km: float
+    minutes: float
+    zones: Tuple[Tuple[str, float], ...]
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TrainingSession:
     type: str
     date: str
-    activities: List[Activity]
-    base_distance: float  # Adicionado campo para distância base
-
-def calculate_paces(average_pace: str) -> dict:
-    minutes, seconds = map(int, average_pace.split(':'))
-    base_seconds = minutes * 60 + seconds
-    
-    paces = {
-        'very_fast': max(base_seconds - 30, 180),  # Não menor que 3:00 min/km
-        'fast': max(base_seconds, 210),  # Não menor que 3:30 min/km
-        'threshold': base_seconds + 30,
-        'easy': base_seconds + 60
-    }
-    return {k: f"{int(v // 60)}:{int(v % 60):02d}" for k, v in paces.items()}
+    activities: Tuple[Activity, ...]
+    base_distance: Optional[float] = None  # Adicionado campo para distância base (só no esquema v1)
+    load: Optional[SessionLoad] = field(default=None, compare=False)
+
+shared_activities = {}
+
+def shared_activity(description: str, **fields) -> Activity:
+    key = (description, tuple(sorted(fields.items())))
+    if key not in shared_activities:
+        shared_activities[key] = Activity(description, **fields)
+    return shared_activities[key]
+
+def sum_loads(nodes, times: int = 1) -> tuple:
+    # (km, minutos, zonas) somados num único laço, multiplicados por times
+    km = minutes = 0.0
+    zones = {}
+    for node in nodes:
+        km += node.km
+        minutes += node.minutes
+        for zone, zone_km in node.zones:
+            zones[zone] = zones.get(zone, 0.0) + zone_km
+    if times == 1:
+        return km, minutes, tuple(zones.items())
+    return km * times, minutes * times, tuple([(zone, zone_km * times) for zone, zone_km in zones.items()])
 
-def adjust_pace(base_pace: str, adjustment: int) -> str:
-    minutes, seconds = map(int, base_pace.split(':'))
-    total_seconds = minutes * 60 + seconds + adjustment
-    return f"{int(total_seconds // 60)}:{int(total_seconds % 60):02d}"
+def combine_loads(nodes) -> SessionLoad:
+    # Soma atividades de uma sessão ou cargas de várias sessões
+    return SessionLoad(*sum_loads(nodes))
 
-def generate_regenerative_session(date: str, week: int, base_distance: float) -> TrainingSession:
-    distance_multiplier = calculate_distance_multiplier(week)
-    base_regenerative_distance = base_distance * 0.7  # 70% da distância base
+def make_session(session_type: str, date: str, activities: Tuple[Activity, ...],
+                 base_distance: Optional[float]) -> TrainingSession:
+    if len(activities) == 1:  # regenerativo e longo
+        activity = activities[0]
+        load = SessionLoad(activity.km, activity.minutes, activity.zones)
+    else:
+        load = combine_loads(activities)
+    return TrainingSession(session_type, date, activities, base_distance, load)
+
+# Zona de pace das corridas sem faixa própria
+ZONE_BY_INTENSITY = {"Muito forte": 'very_fast', "Leve": 'easy', "Livre": 'easy'}
 
-    return TrainingSession("Regenerativo", date, [
-        Activity("Correr", distance=f"{base_regenerative_distance * distance_multiplier:.1f}km", intensity="Leve")
-    ], base_distance)
+def run_activity(km: float, zone: str, pace_seconds: float, pace: Optional[PaceRange] = None,
+                 intensity: Optional[str] = None) -> Activity:
+    # km arredondado como no texto exibido, para os totais baterem com ele
+    km = round(km, 1)
+    return Activity("Correr", f"{km:.1f}km", None, pace, intensity, None, (), km, km * pace_seconds / 60, ((zone, km),))
+
+def duration_minutes(text: str) -> float:
+    # "8min" -> 8, "2min30seg" -> 2.5
+    minutes, _, seconds = text.partition('min')
+    return int(minutes) + (int(seconds[:-len('seg')]) / 60 if seconds else 0)
+
+def calculate_paces(average_pace: Pace) -> dict:
+    return {
+        'very_fast': Pace(max(average_pace - 30, 180)),  # Não menor que 3:00 min/km
+        'fast': Pace(max(average_pace, 210)),  # Não menor que 3:30 min/km
+        'threshold': average_pace + 30,
+        'easy': average_pace + 60
+    }
 
 def calculate_distance_multiplier(week: int) -> float:
     cycle = (week - 1) // 6  # Determina em qual ciclo de 6 semanas estamos
@@ -60,167 +352,134 @@ def calculate_distance_multiplier(week: int) -> float:
 def km_to_minutes(km):
     return int(km * 1)  # Assumindo um ritmo médio de 1 min/km
 
-def generate_interval_session(paces: dict, week: int, date: str, base_distance: float) -> TrainingSession:
-    distance_multiplier = calculate_distance_multiplier(week)
-    
-    if week % 6 == 1:
-        interval_distance = base_distance * 0.1  # 10% da distância base
-        return TrainingSession("Intervalado", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 5x", repetitions=5, activities=[
-                Activity("Correr", distance=f"{interval_distance * distance_multiplier:.1f}km", pace=f"{paces['fast']} a {adjust_pace(paces['fast'], 5)} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 2:
-        interval_distance = base_distance * 0.05  # 5% da distância base
-        return TrainingSession("Intervalado", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 3x", repetitions=3, activities=[
-                Activity("Correr", distance=f"{0.5 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 5)} a {adjust_pace(paces['fast'], 10)} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Repetir 3x", repetitions=3, activities=[
-                Activity("Correr", distance=f"{0.4 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], -5)} a {paces['fast']} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 3:
-        interval_distance = base_distance * 0.12  # 12% da distância base
-        return TrainingSession("Intervalado", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 3x", repetitions=3, activities=[
-                Activity("Correr", distance=f"{0.12 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 15)} a {adjust_pace(paces['fast'], 20)} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre"),
-                Activity("Correr", distance=f"{0.06 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], -15)} a {adjust_pace(paces['fast'], -10)} min/km")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 4:
-        interval_distance = base_distance * 0.04  # 4% da distância base
-        return TrainingSession("Intervalado", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 12x", repetitions=12, activities=[
-                Activity("Correr", distance=f"{0.04 * base_distance * distance_multiplier:.1f}km", pace=f"{paces['very_fast']} a {adjust_pace(paces['very_fast'], 5)} min/km"),
-                Activity("Descansar", duration="1min30seg", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 5:
-        interval_distance = base_distance * 0.08  # 8% da distância base
-        return TrainingSession("Intervalado", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 6x", repetitions=6, activities=[
-                Activity("Correr", distance=f"{0.08 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], -5)} a {paces['fast']} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    else:  # week % 6 == 0
-        interval_distance = base_distance * 0.02  # 2% da distância base
-        return TrainingSession("Intervalado", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 2x", repetitions=2, activities=[
-                Activity("Correr", distance=f"{0.1 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 5)} a {adjust_pace(paces['fast'], 10)} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Repetir 3x", repetitions=3, activities=[
-                Activity("Correr", distance=f"{0.05 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], -15)} a {adjust_pace(paces['fast'], -10)} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Repetir 5x", repetitions=5, activities=[
-                Activity("Correr", distance=f"{0.02 * base_distance * distance_multiplier:.1f}km", intensity="Muito forte"),
-                Activity("Descansar", duration="1min30seg", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-
-def generate_threshold_session(paces: dict, week: int, date: str, base_distance: float) -> TrainingSession:
-    distance_multiplier = calculate_distance_multiplier(week)
-    
-    if week % 6 == 1:
-        threshold_distance = base_distance * 0.1  # 10% da distância base
-        return TrainingSession("Progressivo", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 5x", repetitions=5, activities=[
-                Activity("Correr", distance=f"{threshold_distance * distance_multiplier:.1f}km", pace=f"{paces['fast']} a {adjust_pace(paces['fast'], 5)} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 2:
-        threshold_distance = base_distance * 0.15  # 15% da distância base
-        return TrainingSession("Limiar", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 2x", repetitions=2, activities=[
-                Activity("Correr", distance=f"{0.15 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 35)} a {adjust_pace(paces['fast'], 40)} min/km"),
-                Activity("Descansar", duration="2min30seg", intensity="Livre")
-            ]),
-            Activity("Repetir 2x", repetitions=2, activities=[
-                Activity("Correr", distance=f"{0.12 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 25)} a {adjust_pace(paces['fast'], 30)} min/km"),
-                Activity("Descansar", duration="2min", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 3:
-        threshold_distance = base_distance * 0.07  # 7% da distância base
-        return TrainingSession("Fartlek", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 6x", repetitions=6, activities=[
-                Activity("Correr", distance=f"{0.07 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 25)} a {adjust_pace(paces['fast'], 30)} min/km"),
-                Activity("Correr", distance=f"{0.03 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['easy'], 5)} a {adjust_pace(paces['easy'], 10)} min/km")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 4:
-        threshold_distance = base_distance * 0.4  # 40% da distância base
-        return TrainingSession("Limiar", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Correr", distance=f"{0.4 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 35)} a {adjust_pace(paces['fast'], 40)} min/km"),
-            Activity("Descansar", duration="4min", intensity="Livre"),
-            Activity("Correr", distance=f"{0.2 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 25)} a {adjust_pace(paces['fast'], 30)} min/km"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Correr", distance=f"{0.1 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 25)} a {adjust_pace(paces['fast'], 30)} min/km"),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    elif week % 6 == 5:
-        threshold_distance = base_distance * 0.5  # 50% da distância base
-        return TrainingSession("Limiar", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Correr", distance=f"{0.5 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 35)} a {adjust_pace(paces['fast'], 40)} min/km"),
-            Activity("Descansar", duration="4min", intensity="Livre"),
-            Activity("Correr", distance=f"{0.2 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 25)} a {adjust_pace(paces['fast'], 30)} min/km"),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    else:  # week % 6 == 0
-        threshold_distance = base_distance * 0.35  # 35% da distância base
-        return TrainingSession("Limiar", date, [
-            Activity("Aquecer", duration="8min", intensity="Trote leve"),
-            Activity("Descansar", duration="3min", intensity="Livre"),
-            Activity("Repetir 2x", repetitions=2, activities=[
-                Activity("Correr", distance=f"{0.35 * base_distance * distance_multiplier:.1f}km", pace=f"{adjust_pace(paces['fast'], 25)} a {adjust_pace(paces['fast'], 30)} min/km"),
-                Activity("Descansar", duration="4min", intensity="Livre")
-            ]),
-            Activity("Desaquecer", duration="6min", intensity="Livre")
-        ], base_distance)
-    
-def calculate_base_long_run_distance(average_pace: str, base_distance: float) -> float:
-    minutes, seconds = map(int, average_pace.split(':'))
-    pace_seconds = minutes * 60 + seconds
-    
+# Templates das sessões de qualidade, indexados pela semana do ciclo (1..6).
+# Cada corrida guarda a fração da distância base e a faixa de pace como
+# (pace de referência, ajuste inicial, ajuste final) em segundos.
+WARM_UP = ('fixed', "Aquecer", {'duration': "8min", 'intensity': "Trote leve"})
+REST_3MIN = ('fixed', "Descansar", {'duration': "3min", 'intensity': "Livre"})
+COOL_DOWN = ('fixed', "Desaquecer", {'duration': "6min", 'intensity': "Livre"})
+
+def rest(duration: str) -> tuple:
+    return ('fixed', "Descansar", {'duration': duration, 'intensity': "Livre"})
+
+def run(fraction: float, pace: Optional[tuple] = None, intensity: Optional[str] = None) -> tuple:
+    return ('run', fraction, pace, intensity)
+
+def repeat(times: int, *activities: tuple) -> tuple:
+    return ('repeat', times, activities)
+
+INTERVAL_TEMPLATES = {
+    1: ("Intervalado", [WARM_UP, REST_3MIN, repeat(5, run(0.1, ('fast', 0, 5)), rest("2min")), COOL_DOWN]),
+    2: ("Intervalado", [WARM_UP, REST_3MIN,
+                        repeat(3, run(0.5, ('fast', 5, 10)), rest("2min")),
+                        repeat(3, run(0.4, ('fast', -5, 0)), rest("2min")),
+                        COOL_DOWN]),
+    3: ("Intervalado", [WARM_UP, REST_3MIN,
+                        repeat(3, run(0.12, ('fast', 15, 20)), rest("2min"), run(0.06, ('fast', -15, -10))),
+                        COOL_DOWN]),
+    4: ("Intervalado", [WARM_UP, REST_3MIN, repeat(12, run(0.04, ('very_fast', 0, 5)), rest("1min30seg")), COOL_DOWN]),
+    5: ("Intervalado", [WARM_UP, REST_3MIN, repeat(6, run(0.08, ('fast', -5, 0)), rest("2min")), COOL_DOWN]),
+    6: ("Intervalado", [WARM_UP, REST_3MIN,
+                        repeat(2, run(0.1, ('fast', 5, 10)), rest("2min")),
+                        repeat(3, run(0.05, ('fast', -15, -10)), rest("2min")),
+                        repeat(5, run(0.02, intensity="Muito forte"), rest("1min30seg")),
+                        COOL_DOWN]),
+}
+
+THRESHOLD_TEMPLATES = {
+    1: ("Progressivo", [WARM_UP, REST_3MIN, repeat(5, run(0.1, ('fast', 0, 5)), rest("2min")), COOL_DOWN]),
+    2: ("Limiar", [WARM_UP, REST_3MIN,
+                   repeat(2, run(0.15, ('fast', 35, 40)), rest("2min30seg")),
+                   repeat(2, run(0.12, ('fast', 25, 30)), rest("2min")),
+                   COOL_DOWN]),
+    3: ("Fartlek", [WARM_UP, REST_3MIN, repeat(6, run(0.07, ('fast', 25, 30)), run(0.03, ('easy', 5, 10))), COOL_DOWN]),
+    4: ("Limiar", [WARM_UP, REST_3MIN,
+                   run(0.4, ('fast', 35, 40)), rest("4min"),
+                   run(0.2, ('fast', 25, 30)), rest("3min"),
+                   run(0.1, ('fast', 25, 30)),
+                   COOL_DOWN]),
+    5: ("Limiar", [WARM_UP, REST_3MIN, run(0.5, ('fast', 35, 40)), rest("4min"), run(0.2, ('fast', 25, 30)), COOL_DOWN]),
+    6: ("Limiar", [WARM_UP, REST_3MIN, repeat(2, run(0.35, ('fast', 25, 30)), rest("4min")), COOL_DOWN]),
+}
+
+# Esquema v4: só a semana 1 do ciclo tem sessão própria, as semanas 2 a 6
+# repetem a mesma. As frações multiplicam o fator de progressão semanal.
+WEEKLY_INTERVAL_TEMPLATES = {
+    1: ("Intervalado", [WARM_UP, REST_3MIN, repeat(5, run(1, ('fast', 0, 5)), rest("2min")), COOL_DOWN]),
+    **dict.fromkeys(range(2, 7), ("Intervalado", [WARM_UP, REST_3MIN,
+                                                  repeat(2, run(1, ('fast', 5, 10)), rest("2min")),
+                                                  repeat(3, run(0.5, ('fast', -15, -10)), rest("2min")),
+                                                  repeat(5, run(0.2, intensity="Muito forte"), rest("1min30seg")),
+                                                  COOL_DOWN])),
+}
+
+WEEKLY_THRESHOLD_TEMPLATES = {
+    1: ("Progressivo", [WARM_UP, REST_3MIN, repeat(5, run(1, ('fast', 0, 5)), rest("2min")), COOL_DOWN]),
+    **dict.fromkeys(range(2, 7), ("Limiar", [WARM_UP, REST_3MIN, repeat(2, run(3.5, ('fast', 25, 30)), rest("4min")), COOL_DOWN])),
+}
+
+def pace_band(paces: dict, band: tuple) -> PaceRange:
+    key, low, high = band
+    return PaceRange(paces[key] + low, paces[key] + high)
+
+def nearest_zone(paces: dict, pace_seconds: float) -> str:
+    # A faixa é escrita relativa a um pace de referência (fast+25..30 é limiar);
+    # a zona é a do pace nomeado mais próximo do meio da faixa
+    return min(paces, key=lambda zone: abs(paces[zone] - pace_seconds))
+
+def compile_activity(node: tuple):
+    # Converte o nó do template em uma função (base_distance, multiplier, paces) -> Activity
+    kind = node[0]
+    if kind == 'fixed':
+        _, description, fields = node
+        activity = shared_activity(description, minutes=duration_minutes(fields['duration']), **fields)
+        return lambda base_distance, multiplier, paces: activity
+    if kind == 'run':
+        _, fraction, band, intensity = node
+        if band is None:
+            zone = ZONE_BY_INTENSITY[intensity]
+            return lambda base_distance, multiplier, paces: run_activity(
+                fraction * base_distance * multiplier, zone, paces[zone], intensity=intensity)
+
+        key, low, high = band
+        middle = (low + high) / 2  # pace estimado: meio da faixa
+
+        def build_run(base_distance, multiplier, paces):
+            pace_seconds = float(paces[key]) + middle
+            return run_activity(fraction * base_distance * multiplier, nearest_zone(paces, pace_seconds), pace_seconds,
+                                pace=pace_band(paces, band))
+        return build_run
+    _, times, children = node
+    description = f"Repetir {times}x"
+    builders = [compile_activity(child) for child in children]
+
+    def build_repeat(base_distance, multiplier, paces):
+        activities = tuple([build(base_distance, multiplier, paces) for build in builders])
+        km, minutes, zones = sum_loads(activities, times)
+        return Activity(description, repetitions=times, activities=activities, km=km, minutes=minutes, zones=zones)
+    return build_repeat
+
+def compile_templates(templates: dict) -> dict:
+    return {
+        cycle_week: (session_type, [compile_activity(node) for node in nodes])
+        for cycle_week, (session_type, nodes) in templates.items()
+    }
+
+COMPILED_INTERVAL_TEMPLATES = compile_templates(INTERVAL_TEMPLATES)
+COMPILED_THRESHOLD_TEMPLATES = compile_templates(THRESHOLD_TEMPLATES)
+COMPILED_WEEKLY_INTERVAL_TEMPLATES = compile_templates(WEEKLY_INTERVAL_TEMPLATES)
+COMPILED_WEEKLY_THRESHOLD_TEMPLATES = compile_templates(WEEKLY_THRESHOLD_TEMPLATES)
+
+def build_session(templates: dict, paces: dict, week: int, date: str, scale: float, multiplier: float,
+                  base_distance: Optional[float]) -> TrainingSession:
+    session_type, builders = templates[(week - 1) % len(templates) + 1]
+    return make_session(session_type, date, tuple(
+        build(scale, multiplier, paces) for build in builders
+    ), base_distance)
+
+def calculate_base_long_run_distance(average_pace: Pace, base_distance: float) -> float:
+    pace_seconds = average_pace
+
     # Ajuste a distância base de acordo com o pace
     if pace_seconds < 300:  # Menos de 5:00 min/km
         return base_distance * 1.2
@@ -236,59 +495,1030 @@ def calculate_long_run_distance(base_distance: float, week: int) -> float:
     increase_factor = 1 + (0.2 * cycle)  # 20% de aumento a cada ciclo
     return round(base_distance * increase_factor, 1)
 
-def generate_long_run_session(average_pace: str, week: int, date: str, base_distance: float) -> TrainingSession:
-    base_long_run_distance = calculate_base_long_run_distance(average_pace, base_distance)
-    distance = calculate_long_run_distance(base_long_run_distance, week)
+def count_activities(nodes: list) -> int:
+    # Atividades geradas por uma lista de nós, contando as de dentro das repetições
+    return sum(1 + count_activities(node[2]) if node[0] == 'repeat' else 1 for node in nodes)
+
+def week_activity_count(interval_templates: dict, threshold_templates: dict) -> int:
+    # Semana mais cara do ciclo; regenerativo e longo têm uma atividade cada
+    return max(2 + count_activities(interval_templates[cycle_week][1]) + count_activities(threshold_templates[cycle_week][1])
+               for cycle_week in interval_templates)
+
+# Estratégias de progressão: cada esquema da API define como paces e
+# distâncias evoluem semana a semana; o resto da geração é compartilhado
+class CycleProgression:
+    # v1: +20% de distância e -10s/km de pace a cada ciclo de 6 semanas,
+    # distâncias proporcionais à base_distance do atleta
+    name = 'cycle'
+    interval_templates = COMPILED_INTERVAL_TEMPLATES
+    threshold_templates = COMPILED_THRESHOLD_TEMPLATES
+    activities_per_week = week_activity_count(INTERVAL_TEMPLATES, THRESHOLD_TEMPLATES)
+
+    def paces(self, average_pace: Pace, week: int) -> dict:
+        return cycle_paces(calculate_paces(average_pace), week)
+
+    def template_scale(self, average_pace: Pace, base_distance: float, week: int) -> tuple:
+        return base_distance, calculate_distance_multiplier(week)
+
+    def regenerative_distance(self, average_pace: Pace, base_distance: float, week: int) -> float:
+        base_regenerative_distance = base_distance * 0.7  # 70% da distância base
+        return base_regenerative_distance * calculate_distance_multiplier(week)
+
+    def long_run_distance(self, average_pace: Pace, base_distance: float, week: int) -> float:
+        base_long_run_distance = calculate_base_long_run_distance(average_pace, base_distance)
+        return calculate_long_run_distance(base_long_run_distance, week)
+
+    def session_base_distance(self, base_distance: float) -> Optional[float]:
+        return base_distance
+
+class WeeklyProgression:
+    # v4: longo cresce 0.5 km por semana (no máximo +5 km) a partir de uma
+    # base que depende só do pace; as demais sessões seguem a mesma proporção
+    name = 'weekly'
+    interval_templates = COMPILED_WEEKLY_INTERVAL_TEMPLATES
+    threshold_templates = COMPILED_WEEKLY_THRESHOLD_TEMPLATES
+    activities_per_week = week_activity_count(WEEKLY_INTERVAL_TEMPLATES, WEEKLY_THRESHOLD_TEMPLATES)
+    increase_rate = 0.5  # km por semana
+    max_increase = 5  # aumento total máximo (km)
+
+    def paces(self, average_pace: Pace, week: int) -> dict:
+        cycle = (week - 1) // 6 + 1
+        base_seconds = max(average_pace - (cycle - 1) * 10, 180)  # Não menor que 3:00 min/km
+        return {
+            'very_fast': Pace(max(base_seconds - 30, 180)),
+            'fast': Pace(max(base_seconds, 210)),
+            'threshold': Pace(base_seconds + 30),
+            'easy': Pace(base_seconds + 60)
+        }
+
+    def base_long_run_distance(self, average_pace: Pace) -> float:
+        if average_pace < 300:  # Menos de 5:00 min/km
+            return 12
+        elif average_pace < 360:  # Menos de 6:00 min/km
+            return 10
+        elif average_pace < 420:  # Menos de 7:00 min/km
+            return 8
+        else:
+            return 6
+
+    def long_run_distance(self, average_pace: Pace, base_distance: float, week: int) -> float:
+        base = self.base_long_run_distance(average_pace)
+        return min(base + (week - 1) * self.increase_rate, base + self.max_increase)
+
+    def distance_factor(self, average_pace: Pace, week: int) -> float:
+        return self.long_run_distance(average_pace, 0, week) / self.base_long_run_distance(average_pace)
+
+    def template_scale(self, average_pace: Pace, base_distance: float, week: int) -> tuple:
+        return 1, self.distance_factor(average_pace, week)
+
+    def regenerative_distance(self, average_pace: Pace, base_distance: float, week: int) -> float:
+        return 7 * self.distance_factor(average_pace, week)
 
-    return TrainingSession("Longo", date, [
-        Activity("Correr", distance=f"{distance:.1f}km", intensity="Livre")
-    ], base_distance)
+    def session_base_distance(self, base_distance: float) -> Optional[float]:
+        return None
 
-def generate_training_plan(average_pace: str, start_date: str, num_weeks: int, base_distance: float) -> dict:
+CYCLE_PROGRESSION = CycleProgression()
+WEEKLY_PROGRESSION = WeeklyProgression()
+PROGRESSIONS = {progression.name: progression for progression in (CYCLE_PROGRESSION, WEEKLY_PROGRESSION)}
+
+def generate_regenerative_session(progression, average_pace: Pace, paces: dict, week: int, date: str, base_distance: float) -> TrainingSession:
+    distance = progression.regenerative_distance(average_pace, base_distance, week)
+    return make_session("Regenerativo", date, (
+        run_activity(distance, 'easy', paces['easy'], intensity="Leve"),
+    ), progression.session_base_distance(base_distance))
+
+def generate_interval_session(progression, average_pace: Pace, paces: dict, week: int, date: str, base_distance: float) -> TrainingSession:
+    scale, multiplier = progression.template_scale(average_pace, base_distance, week)
+    return build_session(progression.interval_templates, paces, week, date, scale, multiplier,
+                         progression.session_base_distance(base_distance))
+
+def generate_threshold_session(progression, average_pace: Pace, paces: dict, week: int, date: str, base_distance: float) -> TrainingSession:
+    scale, multiplier = progression.template_scale(average_pace, base_distance, week)
+    return build_session(progression.threshold_templates, paces, week, date, scale, multiplier,
+                         progression.session_base_distance(base_distance))
+
+def generate_long_run_session(progression, average_pace: Pace, paces: dict, week: int, date: str, base_distance: float) -> TrainingSession:
+    distance = progression.long_run_distance(average_pace, base_distance, week)
+    return make_session("Longo", date, (
+        run_activity(distance, 'easy', paces['easy'], intensity="Livre"),
+    ), progression.session_base_distance(base_distance))
+
+DATE_FORMAT = re.compile(r'([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})')
+
+def parse_date(text: str) -> datetime:
+    # Mesmo formato de strptime("%d/%m/%Y"), sem o import tardio do _strptime
+    # que pesa no primeiro request de cada instância
+    match = DATE_FORMAT.fullmatch(text)
+    if match is None:
+        raise ValueError(f"time data {text!r} does not match format '%d/%m/%Y'")
+    day, month, year = map(int, match.groups())
+    return datetime(year, month, day)
+
+def session_dates(start_date: str, num_weeks: int) -> List[str]:
+    # Uma sessão a cada 2 dias, 4 sessões por semana
+    current_date = parse_date(start_date)
+    return [(current_date + timedelta(days=2 * i)).strftime("%d/%m") for i in range(num_weeks * 4)]
+
+def cycle_paces(paces: dict, week: int) -> dict:
+    cycle_number = (week - 1) // 6 + 1
+    return {k: v - 10 * (cycle_number - 1) for k, v in paces.items()}
+
+def generate_week(average_pace: Pace, week: int, dates: List[str], base_distance: float,
+                  progression=CYCLE_PROGRESSION) -> List[TrainingSession]:
+    paces = progression.paces(average_pace, week)
+    args = (progression, average_pace, paces, week)
+    timings = request_timings()
+    if timings is not None:
+        return [
+            timings.call('regenerative', generate_regenerative_session, *args, dates[0], base_distance),
+            timings.call('interval', generate_interval_session, *args, dates[1], base_distance),
+            timings.call('threshold', generate_threshold_session, *args, dates[2], base_distance),
+            timings.call('long_run', generate_long_run_session, *args, dates[3], base_distance),
+        ]
+    return [
+        generate_regenerative_session(*args, dates[0], base_distance),
+        generate_interval_session(*args, dates[1], base_distance),
+        generate_threshold_session(*args, dates[2], base_distance),
+        generate_long_run_session(*args, dates[3], base_distance),
+    ]
+
+class PlanCache:
+    # Cache LRU de esqueletos de plano (sem datas), chaveado por
+    # (pace, num_weeks, base_distance). Além do número de entradas, o total
+    # de semanas guardadas é limitado por max_weeks (cada semana ocupa uns
+    # 4 KB); planos maiores que isso não são guardados.
+    def __init__(self, maxsize: int = 256, max_weeks: int = 10000):
+        self.maxsize = maxsize
+        self.max_weeks = max_weeks
+        self.weeks = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            skeleton = self._entries.get(key)
+            if skeleton is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return skeleton
+
+    def put(self, key: tuple, skeleton: list):
+        if self.maxsize <= 0 or len(skeleton) > self.max_weeks:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.weeks -= len(previous)
+            self._entries[key] = skeleton
+            self.weeks += len(skeleton)
+            while len(self._entries) > self.maxsize or self.weeks > self.max_weeks:
+                _, evicted = self._entries.popitem(last=False)
+                self.weeks -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weeks = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'weeks': self.weeks,
+                'max_weeks': self.max_weeks,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+plan_cache = PlanCache(int(os.environ.get('PLAN_CACHE_SIZE', 256)), int(os.environ.get('PLAN_CACHE_WEEKS', 10000)))
+
+def generate_plan_skeleton(average_pace: Pace, num_weeks: int, base_distance: float,
+                           progression=CYCLE_PROGRESSION) -> List[List[TrainingSession]]:
+    no_dates = [None] * 4
+    return [
+        generate_week(average_pace, week, no_dates, base_distance, progression)
+        for week in range(1, num_weeks + 1)
+    ]
+
+def plan_skeleton(average_pace: Pace, num_weeks: int, base_distance: float,
+                  progression=CYCLE_PROGRESSION) -> List[List[TrainingSession]]:
+    key = (progression.name, average_pace, num_weeks, base_distance)
+    skeleton = plan_cache.get(key)
+    if skeleton is None:
+        skeleton = generate_plan_skeleton(average_pace, num_weeks, base_distance, progression)
+        plan_cache.put(key, skeleton)
+    return skeleton
+
+def stamp_dates(skeleton: List[List[TrainingSession]], dates: List[str]) -> dict:
     plan = {}
-    paces = calculate_paces(average_pace)
-    current_date = datetime.strptime(start_date, "%d/%m/%Y")
-    
-    for week in range(1, num_weeks + 1):
-        cycle_week = (week - 1) % 6 + 1
-        cycle_number = (week - 1) // 6 + 1
-        
-        adjusted_paces = {k: adjust_pace(v, -10 * (cycle_number - 1)) for k, v in paces.items()}
-        
-        week_sessions = []
-        for day in range(4):
-            date_str = current_date.strftime("%d/%m")
-            if day == 0:
-                week_sessions.append(generate_regenerative_session(date_str, week, base_distance))
-            elif day == 1:
-                week_sessions.append(generate_interval_session(adjusted_paces, week, date_str, base_distance))
-            elif day == 2:
-                week_sessions.append(generate_threshold_session(adjusted_paces, week, date_str, base_distance))
-            else:
-                week_sessions.append(generate_long_run_session(average_pace, week, date_str, base_distance))
-            current_date += timedelta(days=2)
-        
-        plan[f"Semana {week}"] = week_sessions
-    
+    for week, week_sessions in enumerate(skeleton, start=1):
+        week_dates = dates[(week - 1) * 4:week * 4]
+        plan[f"Semana {week}"] = [
+            TrainingSession(session.type, date, session.activities, session.base_distance, session.load)
+            for session, date in zip(week_sessions, week_dates)
+        ]
     return plan
 
-@app.route('/calculate', methods=['POST'])
-def calculate():
-    data = request.json
+def generate_training_plan(average_pace: Pace, start_date: str, num_weeks: int, base_distance: float,
+                           progression=CYCLE_PROGRESSION) -> dict:
+    skeleton = plan_skeleton(average_pace, num_weeks, base_distance, progression)
+    return stamp_dates(skeleton, session_dates(start_date, num_weeks))
+
+def iter_training_plan(average_pace: Pace, start_date: str, num_weeks: int, base_distance: float, first_week: int = 1,
+                       progression=CYCLE_PROGRESSION):
+    # Gera o plano semana a semana, sem manter as semanas anteriores em memória.
+    # Cada semana ocupa 8 dias, então first_week pula direto para a semana pedida.
+    # A data é validada já na chamada, antes que uma resposta em streaming comece.
+    current_date = parse_date(start_date) + timedelta(days=8 * (first_week - 1))
+    return iter_weeks(average_pace, current_date, first_week, num_weeks, base_distance, progression)
+
+def iter_weeks(average_pace: Pace, current_date: datetime, first_week: int, num_weeks: int, base_distance: float,
+               progression):
+    for week in range(first_week, num_weeks + 1):
+        week_dates = [(current_date + timedelta(days=2 * day)).strftime("%d/%m") for day in range(4)]
+        current_date += timedelta(days=8)
+        yield f"Semana {week}", generate_week(average_pace, week, week_dates, base_distance, progression)
+
+def replan_training_plan(average_pace: Pace, new_pace: Pace, start_date: str, num_weeks: int, base_distance: float,
+                         change_week: int, progression=CYCLE_PROGRESSION) -> List[tuple]:
+    # Semanas anteriores a change_week não mudam; das demais, só as sessões
+    # que ficam diferentes com o novo pace entram no delta (semana, índice, sessão)
+    old_weeks = iter_training_plan(average_pace, start_date, num_weeks, base_distance, change_week, progression)
+    new_weeks = iter_training_plan(new_pace, start_date, num_weeks, base_distance, change_week, progression)
+    changes = []
+    for week, ((_, old_sessions), (_, new_sessions)) in enumerate(zip(old_weeks, new_weeks), start=change_week):
+        for index, (old_session, new_session) in enumerate(zip(old_sessions, new_sessions)):
+            if old_session != new_session:
+                changes.append((week, index, new_session))
+    return changes
+
+def generate_training_plans(profiles: List[tuple], build_sessions: bool = True) -> List[dict]:
+    # profiles: (average_pace, start_date, num_weeks, base_distance) por atleta.
+    # As tabelas por semana (multiplicadores, datas, paces por ciclo) são
+    # calculadas uma vez para o lote e compartilhadas entre os atletas;
+    # as sessões vêm do cache de esqueletos.
+    max_weeks = max((num_weeks for _, _, num_weeks, _ in profiles), default=0)
+    multipliers = [calculate_distance_multiplier(week) for week in range(1, max_weeks + 1)]
+    # Datas calculadas até a maior semana de cada start_date, não do lote
+    # inteiro: uma data perto do fim do calendário só cabe no próprio plano
+    weeks_by_start = {}
+    for _, start_date, num_weeks, _ in profiles:
+        weeks_by_start[start_date] = max(weeks_by_start.get(start_date, 0), num_weeks)
+    dates_by_start = {}
+    paces_by_athlete_pace = {}
+
+    results = []
+    for average_pace, start_date, num_weeks, base_distance in profiles:
+        if build_sessions:
+            if start_date not in dates_by_start:
+                dates_by_start[start_date] = session_dates(start_date, weeks_by_start[start_date])
+            skeleton = plan_skeleton(average_pace, num_weeks, base_distance)
+            results.append({
+                'pace': f"{average_pace} min/km",
+                'base_distance': f"{base_distance} km",
+                'plan': stamp_dates(skeleton, dates_by_start[start_date])
+            })
+            continue
+
+        if average_pace not in paces_by_athlete_pace:
+            paces = calculate_paces(average_pace)
+            paces_by_athlete_pace[average_pace] = [
+                cycle_paces(paces, cycle * 6 + 1) for cycle in range((max_weeks + 5) // 6)
+            ]
+        weekly_paces = paces_by_athlete_pace[average_pace]
+        long_run_base = calculate_base_long_run_distance(average_pace, base_distance)
+        results.append({
+            'pace': f"{average_pace} min/km",
+            'base_distance': f"{base_distance} km",
+            'weeks': [{
+                'week': week,
+                'distance_multiplier': multipliers[week - 1],
+                'long_run_distance': round(long_run_base * multipliers[week - 1], 1),
+                'pace_seconds': weekly_paces[(week - 1) // 6],
+            } for week in range(1, num_weeks + 1)]
+        })
+
+    return results
+
+class ProfileError(ValueError):
+    # Perfil com tipos válidos mas valores inaceitáveis; a mensagem vai para o cliente
+    pass
+
+def parse_profile(data: dict) -> tuple:
     time_min = int(data['minutes'])
     time_sec = int(data['seconds'])
-    average_pace = f"{time_min}:{time_sec:02d}"
+    average_pace = Pace(time_min * 60 + time_sec)
     start_date = data.get('start_date', datetime.now().strftime("%d/%m/%Y"))
     num_weeks = int(data.get('num_weeks', 6))
     base_distance = float(data.get('base_distance', 10))  # Nova entrada para distância base
-    
-    plan = generate_training_plan(average_pace, start_date, num_weeks, base_distance)
-    
-    return jsonify({
+    if average_pace <= 0:
+        raise ProfileError("'minutes' and 'seconds' should give a positive pace")
+    if num_weeks < 1 or not base_distance > 0:
+        raise ProfileError("'num_weeks' and 'base_distance' should be positive")
+    if not math.isfinite(base_distance):
+        raise ProfileError("'base_distance' should be a finite number")
+    check_plan_dates(start_date, num_weeks)
+    return average_pace, start_date, num_weeks, base_distance
+
+def check_plan_dates(start_date: str, num_weeks: int):
+    # A data precisa ser válida e a última semana (8 dias cada) caber no calendário
+    try:
+        start = parse_date(start_date)
+    except (TypeError, ValueError):
+        raise ProfileError("Invalid date format. Use DD/MM/YYYY")
+    try:
+        start + timedelta(days=8 * num_weeks)
+    except OverflowError:
+        raise ProfileError("The plan would end after year 9999; use an earlier 'start_date' or fewer weeks")
+
+def json_flag(data: dict, name: str, default: bool) -> bool:
+    # Só aceita booleanos JSON: bool("false") seria verdadeiro
+    value = data.get(name, default)
+    if not isinstance(value, bool):
+        raise ProfileError(f"'{name}' should be true or false")
+    return value
+
+# Serialização direta para o buffer de saída, sem as cópias do dataclasses.asdict
+quote = json.encoder.encode_basestring_ascii
+
+def write_optional(out: list, name: str, value, omit_empty: bool):
+    if value is not None:
+        out.append(f',"{name}":')
+        out.append(quote(value) if isinstance(value, str) else str(value))
+    elif not omit_empty:
+        out.append(f',"{name}":null')
+
+def write_activity(activity: Activity, out: list, omit_empty: bool):
+    out.append('{"description":')
+    out.append(quote(activity.description))
+    write_optional(out, 'distance', activity.distance, omit_empty)
+    write_optional(out, 'duration', activity.duration, omit_empty)
+    if activity.pace is not None:
+        out.append(',"pace":')
+        out.append(quote(str(activity.pace)))
+    elif not omit_empty:
+        out.append(',"pace":null')
+    write_optional(out, 'intensity', activity.intensity, omit_empty)
+    write_optional(out, 'repetitions', activity.repetitions, omit_empty)
+    if activity.activities:
+        out.append(',"activities":[')
+        for i, child in enumerate(activity.activities):
+            if i:
+                out.append(',')
+            write_activity(child, out, omit_empty)
+        out.append(']')
+    elif not omit_empty:
+        out.append(',"activities":[]')
+    out.append('}')
+
+def write_session(session: TrainingSession, out: list, omit_empty: bool):
+    out.append('{"type":')
+    out.append(quote(session.type))
+    out.append(',"date":')
+    out.append(quote(session.date))
+    out.append(',"activities":[')
+    for i, activity in enumerate(session.activities):
+        if i:
+            out.append(',')
+        write_activity(activity, out, omit_empty)
+    out.append(']')
+    if session.base_distance is not None:
+        out.append(',"base_distance":')
+        out.append(repr(session.base_distance))
+    out.append('}')
+
+def write_value(value, out: list, omit_empty: bool):
+    if isinstance(value, TrainingSession):
+        write_session(value, out, omit_empty)
+    elif isinstance(value, Activity):
+        write_activity(value, out, omit_empty)
+    elif isinstance(value, dict):
+        out.append('{')
+        for i, (key, item) in enumerate(value.items()):
+            if i:
+                out.append(',')
+            out.append(quote(key))
+            out.append(':')
+            write_value(item, out, omit_empty)
+        out.append('}')
+    elif isinstance(value, (list, tuple)):
+        out.append('[')
+        for i, item in enumerate(value):
+            if i:
+                out.append(',')
+            write_value(item, out, omit_empty)
+        out.append(']')
+    elif isinstance(value, PaceRange):
+        out.append(quote(str(value)))
+    else:
+        out.append(json.dumps(value))
+
+def encode_plan(value, omit_empty: bool = False) -> str:
+    out = []
+    write_value(value, out, omit_empty)
+    return ''.join(out)
+
+def wants_omit_empty() -> bool:
+    return request.args.get('omit_empty', '').lower() in ('1', 'true')
+
+CACHE_MAX_AGE = int(os.environ.get('PLAN_CACHE_MAX_AGE', 86400))
+MIN_COMPRESS_SIZE = 1024
+
+def negotiate_encoding(size: int) -> Optional[str]:
+    # Codificação que a resposta vai usar, decidida antes de comprimir para
+    # que o 304 e o 200 levem o mesmo validador
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    encodings = ['br', 'gzip'] if load_brotli() is not None else ['gzip']
+    return request.accept_encodings.best_match(encodings)
+
+def compress_body(response: Response, data: bytes, encoding: Optional[str]) -> bytes:
+    response.vary.add('Accept-Encoding')
+    if encoding == 'br':
+        data = brotli.compress(data)
+    elif encoding == 'gzip':
+        import gzip
+        data = gzip.compress(data, compresslevel=6)
+    else:
+        return data
+    response.content_encoding = encoding
+    return data
+
+def plan_response(payload: dict) -> Response:
+    with timed('serialize'):
+        data = encode_plan(payload, wants_omit_empty()).encode()
+    return encoded_response(data)
+
+def encoded_response(data: bytes, cacheable: bool = True) -> Response:
+    response = Response(mimetype='application/json')
+
+    if request.method == 'GET':
+        # O plano é função pura dos parâmetros: ETag pelo conteúdo e cache público.
+        # Sem start_date o plano muda a cada dia, e com cacheable=False o corpo
+        # depende de estado do servidor, então nesses casos só revalida.
+        import hashlib
+        etag = hashlib.sha256(data).hexdigest()[:32]
+        if cacheable and 'start_date' in request.args:
+            # s-maxage é o que o CDN da Vercel usa; max-age fica para o navegador
+            response.cache_control.public = True
+            response.cache_control.max_age = CACHE_MAX_AGE
+            response.cache_control.s_maxage = CACHE_MAX_AGE
+        else:
+            response.cache_control.no_cache = True
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(len(data))
+        # A versão comprimida é semanticamente igual, não byte a byte
+        response.set_etag(etag, weak=encoding is not None)
+        if request.if_none_match.contains_weak(etag):
+            response.status_code = 304
+            return response
+        with timed('compress'):
+            body = compress_body(response, data, encoding)
+    else:
+        with timed('compress'):
+            body = compress_body(response, data, negotiate_encoding(len(data)))
+
+    response.set_data(body)
+    return response
+
+def wants_stream() -> bool:
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def stream_training_plan(average_pace: Pace, start_date: str, num_weeks: int, base_distance: float) -> Response:
+    # NDJSON: uma linha de cabeçalho e depois uma linha por semana. O plano
+    # (e a data) é preparado antes do Response, para que um erro vire 400 e
+    # não um 200 truncado
+    omit_empty = wants_omit_empty()
+    weeks = iter_training_plan(average_pace, start_date, num_weeks, base_distance)
+
+    def lines():
+        yield encode_plan({'pace': f"{average_pace} min/km", 'base_distance': f"{base_distance} km"}) + "\n"
+        for week, sessions in timed_iter('generate', weeks):
+            with timed('serialize'):
+                line = encode_plan({'week': week, 'sessions': sessions}, omit_empty) + "\n"
+            yield line
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+# Controle de admissão: o custo de cada pedido é estimado em atividades
+# (semanas x semana mais cara do ciclo) antes de gerar qualquer coisa.
+# Acima de PLAN_COST_BUDGET a resposta é rebaixada para streaming quando o
+# endpoint permite, ou recusada com 413; PLAN_STREAM_COST_BUDGET limita
+# também as respostas em streaming. Lotes e exportações de elenco têm
+# orçamentos próprios, dimensionados para milhares de atletas (no lote sem
+# sessões cada semana custa uma linha, não uma semana de atividades).
+PLAN_COST_BUDGET = int(os.environ.get('PLAN_COST_BUDGET', 10000))
+PLAN_STREAM_COST_BUDGET = int(os.environ.get('PLAN_STREAM_COST_BUDGET', 200000))
+PLAN_BATCH_COST_BUDGET = int(os.environ.get('PLAN_BATCH_COST_BUDGET', 200000))
+PLAN_EXPORT_COST_BUDGET = int(os.environ.get('PLAN_EXPORT_COST_BUDGET', 200000))
+
+def plan_cost(num_weeks: int, progression=CYCLE_PROGRESSION) -> int:
+    return max(num_weeks, 0) * progression.activities_per_week
+
+def weeks_within_budget(budget: int, progression=CYCLE_PROGRESSION) -> int:
+    return budget // progression.activities_per_week
+
+def too_expensive(cost: int, budget: int, hint: str):
+    return jsonify({"error": f"Request too expensive: about {cost} activities, budget is {budget}. {hint}"}), 413
+
+# Limite de requisições por cliente, em memória: um balde de fichas por
+# endereço (RATE_LIMIT_PER_SECOND fichas por segundo, até RATE_LIMIT_BURST).
+# Desligado com RATE_LIMIT_PER_SECOND=0, o padrão.
+class TokenBucketLimiter:
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)  # abaixo de uma ficha nenhuma requisição passaria
+        self.max_clients = max_clients
+        self.rejected = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client: str) -> float:
+        # 0 se a requisição pode seguir, senão os segundos até a próxima ficha
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.rejected += 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)  # cliente inativo há mais tempo
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'clients': len(self._buckets), 'rejected': self.rejected}
+
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', 0))
+rate_limiter = TokenBucketLimiter(RATE_LIMIT_PER_SECOND, float(os.environ.get('RATE_LIMIT_BURST', 2 * RATE_LIMIT_PER_SECOND)))
+RATE_LIMITED_ENDPOINTS = {'calculate', 'calculate_v4', 'plan_weeks', 'summary', 'replan', 'calculate_batch', 'create_job',
+                          'export_roster'}
+
+@app.before_request
+def limit_rate():
+    if not RATE_LIMIT_PER_SECOND or request.method == 'OPTIONS' or request.endpoint not in RATE_LIMITED_ENDPOINTS:
+        return None
+    # Só o endereço da conexão (ou o que o ProxyFix aceitou): X-Forwarded-For
+    # vindo direto do cliente não escolhe o balde
+    wait = rate_limiter.acquire(request.remote_addr or '')
+    if wait:
+        response = jsonify({"error": "Too many requests, slow down"})
+        response.headers['Retry-After'] = str(int(wait) + 1)
+        return response, 429
+    return None
+
+# Armazenamento persistente opcional (PLAN_STORE_DB). Incrementar
+# GENERATOR_VERSION sempre que a saída do gerador mudar: os planos
+# guardados com outra versão são descartados.
+GENERATOR_VERSION = '1'
+
+plan_store = None
+plan_store_lock = threading.Lock()
+
+def get_plan_store():
+    global plan_store
+    if 'PLAN_STORE_DB' not in os.environ:
+        return None
+    with plan_store_lock:
+        if plan_store is None:
+            from plan_store import DEFAULT_MAX_BYTES, PlanStore
+            plan_store = PlanStore(os.environ['PLAN_STORE_DB'], GENERATOR_VERSION,
+                                   int(os.environ.get('PLAN_STORE_MAX_BYTES', DEFAULT_MAX_BYTES)))
+        return plan_store
+
+def v1_payload(profile: tuple) -> dict:
+    average_pace, start_date, num_weeks, base_distance = profile
+    return {
+        'pace': f"{average_pace} min/km",
+        'base_distance': f"{base_distance} km",
+        'plan': generate_training_plan(average_pace, start_date, num_weeks, base_distance)
+    }
+
+def v4_payload(profile: tuple) -> dict:
+    return generate_training_plan(*profile, WEEKLY_PROGRESSION)
+
+PAYLOAD_BUILDERS = {'v1': v1_payload, 'v4': v4_payload}
+
+def canonical_date(start_date: str) -> str:
+    return parse_date(start_date).strftime("%d/%m/%Y")
+
+def stored_plan_params(schema: str, profile: tuple, omit_empty: bool) -> list:
+    average_pace, start_date, num_weeks, base_distance = profile
+    return [schema, int(average_pace), canonical_date(start_date), num_weeks, base_distance, omit_empty]
+
+def plan_body(schema: str, profile: tuple, athlete_id: Optional[str] = None) -> bytes:
+    # Corpo JSON do plano, lido do armazenamento quando habilitado
+    omit_empty = wants_omit_empty()
+    store = get_plan_store()
+    if store is not None:
+        from plan_store import plan_key
+        params = stored_plan_params(schema, profile, omit_empty)
+        key = plan_key(params)
+        with timed('store'):
+            body = store.get(key)
+        if body is None:
+            with timed('generate'):
+                payload = PAYLOAD_BUILDERS[schema](profile)
+            with timed('serialize'):
+                body = encode_plan(payload, omit_empty).encode()
+            store.put(key, params, body)
+        if athlete_id is not None:
+            store.link(str(athlete_id), params[2], key)
+        return body
+
+    with timed('generate'):
+        payload = PAYLOAD_BUILDERS[schema](profile)
+    with timed('serialize'):
+        return encode_plan(payload, omit_empty).encode()
+
+def precompute_plans(start_dates: List[str], paces: List[int], weeks: List[int], distances: List[float]):
+    # Grade de parâmetros para importação em massa no armazenamento de planos
+    from plan_store import plan_key
+    for start_date in start_dates:
+        for pace in paces:
+            for num_weeks in weeks:
+                for base_distance in distances:
+                    profile = (Pace(pace), start_date, num_weeks, base_distance)
+                    params = stored_plan_params('v1', profile, False)
+                    yield plan_key(params), params, encode_plan(v1_payload(profile)).encode()
+
+@app.route('/calculate', methods=['GET', 'POST'])
+@app.route('/v1/calculate', methods=['GET', 'POST'])
+def calculate():
+    with timed('parse'):
+        data = request.args if request.method == 'GET' else request.json
+        try:
+            profile = parse_profile(data)
+        except KeyError as e:
+            return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+        except ProfileError as e:
+            return jsonify({"error": str(e)}), 400
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid data types. 'minutes', 'seconds' and 'num_weeks' should be integers"}), 400
+    average_pace, start_date, num_weeks, base_distance = profile
+
+    cost = plan_cost(num_weeks)
+    if cost > PLAN_STREAM_COST_BUDGET:
+        return too_expensive(cost, PLAN_STREAM_COST_BUDGET,
+                             f"Use at most {weeks_within_budget(PLAN_STREAM_COST_BUDGET)} weeks, or page with /plan?from_week=&to_week=")
+    observe_plan_size(num_weeks)
+
+    if wants_stream() or cost > PLAN_COST_BUDGET:
+        # Acima do orçamento a resposta é rebaixada para NDJSON, semana a semana
+        response = stream_training_plan(average_pace, start_date, num_weeks, base_distance)
+        if cost > PLAN_COST_BUDGET:
+            response.headers['X-Plan-Admission'] = 'stream'
+        return response
+
+    return encoded_response(plan_body('v1', profile, data.get('athlete_id')))
+
+@app.route('/athletes/<athlete_id>/plan', methods=['GET'])
+def athlete_plan(athlete_id: str):
+    store = get_plan_store()
+    if store is None:
+        return jsonify({"error": "Plan store is disabled"}), 404
+    start_date = request.args.get('start_date')
+    try:
+        body = store.athlete_plan(athlete_id, canonical_date(start_date) if start_date else None)
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use DD/MM/YYYY"}), 400
+    if body is None:
+        return jsonify({"error": "Plan not found"}), 404
+    # O plano vinculado mais recente muda quando o atleta gera outro
+    return encoded_response(body, cacheable=False)
+
+def parse_profile_v4(data: dict) -> tuple:
+    # Esquema v4: time5k (segundos), startDate e numWeeks, sem distância base.
+    # Retorna (perfil, None) ou (None, resposta de erro)
+    if not data:
+        return None, (jsonify({"error": "No JSON data received"}), 400)
+
+    required_fields = ['time5k', 'startDate', 'numWeeks']
+    missing_fields = [field for field in required_fields if field not in data]
+
+    if missing_fields:
+        return None, (jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400)
+
+    try:
+        return parse_v4_fields(data), None
+    except ProfileError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+    except (TypeError, ValueError):
+        return None, (jsonify({"error": "Invalid data types. 'time5k' and 'numWeeks' should be integers"}), 400)
+
+def parse_v4_fields(data: dict) -> tuple:
+    # Mesmas regras do /v4/calculate, com ProfileError no lugar da resposta
+    time_5k = int(data['time5k'])
+    start_date = data['startDate']
+    num_weeks = int(data['numWeeks'])
+    if time_5k <= 0 or num_weeks <= 0:
+        raise ProfileError("'time5k' and 'numWeeks' should be positive integers")
+    check_plan_dates(start_date, num_weeks)
+    return Pace(time_5k), start_date, num_weeks, 0.0
+
+@app.route('/v4/calculate', methods=['POST', 'OPTIONS'])
+def calculate_v4():
+    if request.method == "OPTIONS":
+        return {"message": "OK"}, 200
+
+    with timed('parse'):
+        profile, error = parse_profile_v4(request.json)
+    if error is not None:
+        return error
+    cost = plan_cost(profile[2], WEEKLY_PROGRESSION)
+    if cost > PLAN_COST_BUDGET:
+        return too_expensive(cost, PLAN_COST_BUDGET, f"Use at most {weeks_within_budget(PLAN_COST_BUDGET, WEEKLY_PROGRESSION)} weeks")
+    observe_plan_size(profile[2])
+
+    return encoded_response(plan_body('v4', profile, request.json.get('athleteId')))
+
+@app.route('/plan', methods=['GET'])
+def plan_weeks():
+    try:
+        average_pace, start_date, num_weeks, base_distance = parse_profile(request.args)
+        from_week = int(request.args.get('from_week', 1))
+        to_week = int(request.args.get('to_week', num_weeks))
+    except KeyError as e:
+        return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+    except ProfileError as e:
+        return jsonify({"error": str(e)}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid data types. 'minutes', 'seconds', 'num_weeks', 'from_week' and 'to_week' should be integers"}), 400
+
+    if from_week < 1 or to_week < from_week:
+        return jsonify({"error": "'from_week' should be at least 1 and not greater than 'to_week'"}), 400
+    if to_week > num_weeks:
+        return jsonify({"error": "'to_week' should not be greater than 'num_weeks'"}), 400
+    cost = plan_cost(to_week - from_week + 1)
+    if cost > PLAN_COST_BUDGET:
+        return too_expensive(cost, PLAN_COST_BUDGET, f"Request at most {weeks_within_budget(PLAN_COST_BUDGET)} weeks per page")
+
+    observe_plan_size(to_week - from_week + 1)
+    with timed('generate'):
+        plan = dict(iter_training_plan(average_pace, start_date, to_week, base_distance, first_week=from_week))
+
+    return plan_response({
         'pace': f"{average_pace} min/km",
         'base_distance': f"{base_distance} km",
+        'from_week': from_week,
+        'to_week': to_week,
         'plan': plan
     })
 
+def parse_any_profile(data) -> tuple:
+    # Perfil no esquema v1 (minutes/seconds) ou v4 (time5k): (perfil, progressão)
+    if 'time5k' in data:
+        return parse_v4_fields(data), WEEKLY_PROGRESSION
+    return parse_profile(data), CYCLE_PROGRESSION
+
+def load_fields(load: SessionLoad) -> dict:
+    return {
+        'km': round(load.km, 2),
+        'minutes': round(load.minutes, 1),
+        'zones': {zone: round(km, 2) for zone, km in load.zones}
+    }
+
+@app.route('/summary', methods=['GET', 'POST'])
+def summary():
+    # Só os agregados de carga (km, minutos estimados e km por zona de pace),
+    # por sessão, por semana e do plano inteiro, sem as árvores de atividades
+    data = request.args if request.method == 'GET' else request.json
+    try:
+        (average_pace, start_date, num_weeks, base_distance), progression = parse_any_profile(data)
+    except KeyError as e:
+        return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+    except ProfileError as e:
+        return jsonify({"error": str(e)}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid data types or date format"}), 400
+    cost = plan_cost(num_weeks, progression)
+    if cost > PLAN_COST_BUDGET:
+        return too_expensive(cost, PLAN_COST_BUDGET, f"Use at most {weeks_within_budget(PLAN_COST_BUDGET, progression)} weeks")
+    observe_plan_size(num_weeks)
+
+    with timed('generate'):
+        skeleton = plan_skeleton(average_pace, num_weeks, base_distance, progression)
+        dates = session_dates(start_date, num_weeks)
+        week_loads = [combine_loads(session.load for session in sessions) for sessions in skeleton]
+        weeks = [{
+            'week': f"Semana {week}",
+            **load_fields(week_load),
+            'sessions': [
+                {'type': session.type, 'date': date, **load_fields(session.load)}
+                for session, date in zip(sessions, dates[(week - 1) * 4:week * 4])
+            ]
+        } for week, (sessions, week_load) in enumerate(zip(skeleton, week_loads), start=1)]
+
+    return plan_response({
+        'pace': f"{average_pace} min/km",
+        'total': load_fields(combine_loads(week_loads)),
+        'weeks': weeks
+    })
+
+@app.route('/replan', methods=['POST'])
+def replan():
+    data = request.json
+    try:
+        average_pace, start_date, num_weeks, base_distance = parse_profile(data)
+        new_pace = Pace(int(data['new_minutes']) * 60 + int(data['new_seconds']))
+        change_week = int(data['from_week'])
+        if new_pace <= 0:
+            raise ProfileError("'new_minutes' and 'new_seconds' should give a positive pace")
+    except KeyError as e:
+        return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+    except ProfileError as e:
+        return jsonify({"error": str(e)}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid data types. 'new_minutes', 'new_seconds' and 'from_week' should be integers"}), 400
+
+    if not 1 <= change_week <= num_weeks:
+        return jsonify({"error": "'from_week' should be between 1 and 'num_weeks'"}), 400
+    cost = 2 * plan_cost(num_weeks - change_week + 1)  # plano antigo e novo
+    if cost > PLAN_COST_BUDGET:
+        return too_expensive(cost, PLAN_COST_BUDGET, f"Replan at most {weeks_within_budget(PLAN_COST_BUDGET) // 2} weeks")
+
+    observe_plan_size(num_weeks - change_week + 1)
+    with timed('generate'):
+        changes = replan_training_plan(average_pace, new_pace, start_date, num_weeks, base_distance, change_week)
+
+    return plan_response({
+        'pace': f"{new_pace} min/km",
+        'from_week': change_week,
+        'changes': [
+            {'week': f"Semana {week}", 'index': index, 'session': session}
+            for week, index, session in changes
+        ]
+    })
+
+@app.route('/calculate/batch', methods=['POST'])
+def calculate_batch():
+    with timed('parse'):
+        data = request.json
+        try:
+            profiles = [parse_profile(profile) for profile in data['profiles']]
+            build_sessions = json_flag(data, 'sessions', True)
+        except KeyError as e:
+            return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+        except ProfileError as e:
+            return jsonify({"error": str(e)}), 400
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid data types in 'profiles'"}), 400
+    # Sem sessões, cada semana é só uma linha de paces e distâncias
+    cost = sum(plan_cost(profile[2]) if build_sessions else profile[2] for profile in profiles)
+    if cost > PLAN_BATCH_COST_BUDGET:
+        return too_expensive(cost, PLAN_BATCH_COST_BUDGET, "Submit large batches to /jobs")
+    for profile in profiles:
+        observe_plan_size(profile[2])
+
+    with timed('generate'):
+        plans = generate_training_plans(profiles, build_sessions)
+
+    return plan_response({'plans': plans})
+
+def generate_job_chunk(profiles: List[list], options: dict) -> str:
+    # Executado nos processos do pool de jobs
+    plans = generate_training_plans(
+        [(Pace(pace), start_date, num_weeks, base_distance) for pace, start_date, num_weeks, base_distance in profiles],
+        options.get('sessions', True))
+    return encode_plan(plans, options.get('omit_empty', False))
+
+job_queue = None
+job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    # Criada no primeiro uso para não pesar no cold start de quem não usa jobs
+    global job_queue
+    with job_queue_lock:
+        if job_queue is None:
+            from jobs import job_queue_from_env
+            job_queue = job_queue_from_env(generate_job_chunk)
+        return job_queue
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    from jobs import QueueFull
+    data = request.json
+    try:
+        profiles = [parse_profile(profile) for profile in data['profiles']]
+        options = {'sessions': json_flag(data, 'sessions', True), 'omit_empty': json_flag(data, 'omit_empty', False)}
+    except KeyError as e:
+        return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+    except ProfileError as e:
+        return jsonify({"error": str(e)}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid data types in 'profiles'"}), 400
+    cost = max((plan_cost(profile[2]) for profile in profiles), default=0)
+    if cost > PLAN_COST_BUDGET:
+        return too_expensive(cost, PLAN_COST_BUDGET, f"Each profile can have at most {weeks_within_budget(PLAN_COST_BUDGET)} weeks")
+
+    try:
+        job_id = get_job_queue().submit([[int(pace), start_date, num_weeks, base_distance]
+                                         for pace, start_date, num_weeks, base_distance in profiles], options)
+    except QueueFull as e:
+        response = jsonify({"error": f"Job queue is full ({e}), try again later"})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    except ValueError as e:
+        return jsonify({"error": f"Job too large: {e}"}), 413
+
+    return jsonify(get_job_queue().status(job_id)), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str):
+    status = get_job_queue().status(job_id)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id: str):
+    # NDJSON com um bloco de planos por linha, na ordem de envio
+    queue = get_job_queue()
+    if queue.status(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def lines():
+        for idx, plans in queue.results(job_id):
+            yield f'{{"chunk":{idx},"plans":{plans}}}\n'
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+def parse_roster_entry(data: dict) -> tuple:
+    if not isinstance(data, dict):
+        raise TypeError("roster entries should be objects")
+    athlete = str(data.get('name', data.get('athlete_id', '')))
+    return (athlete, *parse_any_profile(data))
+
+def iter_roster_sessions(roster: List[tuple]):
+    # (posição, atleta, semana, índice, data, sessão), uma sessão por vez:
+    # nenhum plano fica inteiro em memória, qualquer que seja o tamanho do elenco
+    for position, (athlete, (average_pace, start_date, num_weeks, base_distance), progression) in enumerate(roster):
+        start = parse_date(start_date)
+        weeks = iter_training_plan(average_pace, start_date, num_weeks, base_distance, progression=progression)
+        for week, (_, sessions) in enumerate(timed_iter('generate', weeks), start=1):
+            for index, session in enumerate(sessions):
+                yield position, athlete, week, index, start + timedelta(days=8 * (week - 1) + 2 * index), session
+
+@app.route('/roster/export.<fmt>', methods=['POST'])
+def export_roster(fmt: str):
+    from export import EXPORTERS
+    if fmt not in EXPORTERS:
+        return jsonify({"error": f"Unsupported format '{fmt}'. Use {', '.join(EXPORTERS)}"}), 404
+    data = request.json
+    try:
+        roster = [parse_roster_entry(entry) for entry in data['athletes']]
+    except KeyError as e:
+        return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+    except ProfileError as e:
+        return jsonify({"error": str(e)}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid data types or date format in 'athletes'"}), 400
+    cost = sum(plan_cost(profile[2], progression) for _, profile, progression in roster)
+    if cost > PLAN_EXPORT_COST_BUDGET:
+        return too_expensive(cost, PLAN_EXPORT_COST_BUDGET, "Split the roster into smaller exports")
+
+    stream, mimetype = EXPORTERS[fmt]
+    response = Response(stream_with_context(stream(iter_roster_sessions(roster))), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="planos.{fmt}"'
+    return response
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = plan_cache.stats()
+    if RATE_LIMIT_PER_SECOND:
+        stats['rate_limit'] = rate_limiter.stats()
+    store = get_plan_store()
+    if store is not None:
+        stats['store'] = store.stats()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Só para coleta local
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({"error": "Not found"}), 404
+    lines = []
+    for histogram in (STAGE_SECONDS, PLAN_WEEKS, PLAN_SESSIONS, RESPONSE_BYTES):
+        lines.extend(histogram.render())
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
\ No newline at end of file
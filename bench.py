@@ -0,0 +1,217 @@
+"""Benchmarks do gerador de planos e do caminho HTTP.
+
+    python bench.py run --output baseline.json
+    python bench.py run --output current.json
+    python bench.py compare baseline.json current.json --threshold 10
+    python bench.py startup --runs 10 --target-ms 100
+
+`compare` termina com código 1 se algum caso ficar mais lento (ou alocar
+mais memória) do que o baseline além do percentual informado. `startup`
+mede, em interpretadores novos, o tempo do import do app.py até a primeira
+resposta de /calculate e falha se a mediana passar de --target-ms.
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+WEEKS = [1, 6, 12, 26, 52, 104, 260, 520]
+BASE_DISTANCES = [5.0, 10.0, 21.1, 42.2]
+HTTP_WEEKS = [6, 52, 260]
+START_DATE = "01/03/2024"
+
+def load_module(name: str, filename: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # app-v4.py importa o motor do app.py
+    spec.loader.exec_module(module)
+    return module
+
+def measure(fn, repeat: int) -> dict:
+    fn()  # aquecimento
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    # Alocações medidas numa execução separada, pois o tracemalloc distorce o tempo
+    tracemalloc.start()
+    fn()
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'median_ms': statistics.median(timings) * 1000,
+        'min_ms': min(timings) * 1000,
+        'peak_kb': peak / 1024,
+        'retained_kb': allocated / 1024,
+    }
+
+def repeat_for(num_weeks: int, quick: bool) -> int:
+    repeat = max(3, min(200, 2000 // num_weeks))
+    return max(3, repeat // 10) if quick else repeat
+
+def bench_generation(app_module, quick: bool) -> dict:
+    results = {}
+    pace = app_module.Pace(270)
+    for base_distance in BASE_DISTANCES:
+        for num_weeks in WEEKS:
+            def generate():
+                app_module.plan_cache.clear()
+                app_module.generate_training_plan(pace, START_DATE, num_weeks, base_distance)
+            results[f"generate/{num_weeks}w/{base_distance}km"] = measure(generate, repeat_for(num_weeks, quick))
+    return results
+
+def bench_serialization(app_module, quick: bool) -> dict:
+    results = {}
+    pace = app_module.Pace(270)
+    for num_weeks in WEEKS:
+        plan = app_module.generate_training_plan(pace, START_DATE, num_weeks, 10.0)
+        payload = {'pace': "4:30 min/km", 'base_distance': "10.0 km", 'plan': plan}
+        repeat = repeat_for(num_weeks, quick)
+        results[f"serialize/encode_plan/{num_weeks}w"] = measure(lambda: app_module.encode_plan(payload), repeat)
+        with app_module.app.app_context():
+            results[f"serialize/jsonify/{num_weeks}w"] = measure(lambda: app_module.jsonify(payload), repeat)
+    return results
+
+def bench_http(quick: bool) -> dict:
+    results = {}
+    v1 = load_module('app', 'app.py')
+    v4 = load_module('app_v4', 'app-v4.py')
+    v1_client = v1.app.test_client()
+    v4_client = v4.app.test_client()
+    for num_weeks in HTTP_WEEKS:
+        repeat = repeat_for(num_weeks, quick)
+        v1_body = {'minutes': 4, 'seconds': 30, 'start_date': START_DATE, 'num_weeks': num_weeks, 'base_distance': 10}
+        v4_body = {'time5k': 1350, 'startDate': START_DATE, 'numWeeks': num_weeks}
+
+        def post_v1():
+            v1.plan_cache.clear()
+            assert v1_client.post('/calculate', json=v1_body).status_code == 200
+
+        def post_v4():
+            v1.plan_cache.clear()  # o app-v4.py usa o mesmo motor e cache do app.py
+            assert v4_client.post('/calculate', json=v4_body).status_code == 200
+
+        results[f"http/app/{num_weeks}w"] = measure(post_v1, repeat)
+        results[f"http/app-v4/{num_weeks}w"] = measure(post_v4, repeat)
+    return results
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().post('/calculate', json={
+    'minutes': 4, 'seconds': 30, 'start_date': '01/03/2024', 'num_weeks': 6, 'base_distance': 10})
+assert response.status_code == 200
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_response_ms': (done - imported) * 1000}))
+"""
+
+def startup(args) -> int:
+    samples = []
+    for _ in range(args.runs):
+        env = dict(os.environ)
+        if args.fresh_bytecode:
+            # Sem .pyc em cache, como numa instância recém-criada
+            env['PYTHONPYCACHEPREFIX'] = tempfile.mkdtemp(prefix='bench-pycache-')
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        process_ms = (time.perf_counter() - start) * 1000
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample['total_ms'] = sample['import_ms'] + sample['first_response_ms']
+        sample['process_ms'] = process_ms
+        samples.append(sample)
+
+    summary = {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+    for key, value in summary.items():
+        print(f"startup/{key:30s} {value:10.3f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'startup': summary, 'samples': samples}, f, indent=2, sort_keys=True)
+
+    if args.target_ms is not None and summary['total_ms'] > args.target_ms:
+        print(f"\nimport-to-first-response {summary['total_ms']:.1f} ms is above the {args.target_ms} ms target")
+        return 1
+    return 0
+
+def run(args) -> int:
+    app_module = load_module('app', 'app.py')
+    results = {}
+    results.update(bench_generation(app_module, args.quick))
+    results.update(bench_serialization(app_module, args.quick))
+    results.update(bench_http(args.quick))
+
+    for name, result in results.items():
+        print(f"{name:40s} {result['median_ms']:10.3f} ms  {result['peak_kb']:10.1f} KB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2, sort_keys=True)
+    return 0
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.current) as f:
+        current = json.load(f)['results']
+
+    limit = 1 + args.threshold / 100
+    regressions = []
+    for name in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[name], current[name]
+        time_ratio = new['median_ms'] / old['median_ms'] if old['median_ms'] else 1.0
+        memory_ratio = new['peak_kb'] / old['peak_kb'] if old['peak_kb'] else 1.0
+        status = "ok"
+        if time_ratio > limit or memory_ratio > limit:
+            status = "REGRESSION"
+            regressions.append(name)
+        print(f"{name:40s} time {time_ratio - 1:+8.1%}  memory {memory_ratio - 1:+8.1%}  {status}")
+
+    for name in sorted(baseline.keys() - current.keys()):
+        print(f"{name:40s} missing from current run")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed beyond {args.threshold}%")
+        return 1
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="executa os benchmarks")
+    run_parser.add_argument('--output', help="arquivo JSON onde salvar os resultados")
+    run_parser.add_argument('--quick', action='store_true', help="menos repetições por caso")
+
+    compare_parser = commands.add_parser('compare', help="compara dois resultados")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="regressão máxima aceita, em %%")
+
+    startup_parser = commands.add_parser('startup', help="mede o cold start do app.py")
+    startup_parser.add_argument('--runs', type=int, default=10)
+    startup_parser.add_argument('--target-ms', type=float, help="falha se a mediana passar deste tempo")
+    startup_parser.add_argument('--fresh-bytecode', action='store_true', help="ignora os .pyc já compilados")
+    startup_parser.add_argument('--output', help="arquivo JSON onde salvar os resultados")
+
+    args = parser.parse_args()
+    return {'run': run, 'compare': compare, 'startup': startup}[args.command](args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# Exportação dos planos de um elenco inteiro em iCalendar e CSV. Cada
+# função recebe as sessões uma a uma (posição no elenco, atleta, semana,
+# índice, data, sessão) e devolve o texto correspondente, para ser enviado
+# conforme é gerado.
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+
+ICAL_HEADER = ("BEGIN:VCALENDAR\r\n"
+               "VERSION:2.0\r\n"
+               "PRODID:-//Plano de Treino//Exportacao//PT\r\n"
+               "CALSCALE:GREGORIAN\r\n")
+ICAL_FOOTER = "END:VCALENDAR\r\n"
+
+CSV_COLUMNS = ['athlete', 'week', 'session', 'date', 'type', 'base_distance', 'activities']
+
+def describe_activity(activity) -> str:
+    details = [value for value in (activity.distance, activity.duration) if value]
+    if activity.pace is not None:
+        details.append(f"@ {activity.pace}")
+    if activity.intensity:
+        details.append(f"({activity.intensity})")
+    text = " ".join([activity.description, *details])
+    if activity.activities:
+        text += ": [" + "; ".join(describe_activity(child) for child in activity.activities) + "]"
+    return text
+
+def describe_session(session) -> str:
+    return "; ".join(describe_activity(activity) for activity in session.activities)
+
+def ical_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def uid_part(athlete: str) -> str:
+    return "".join(ch for ch in athlete if ch.isalnum() or ch in "-_.") or "atleta"
+
+def ical_line(text: str) -> str:
+    # Linhas de no máximo 75 octetos; as continuações começam com espaço
+    data = text.encode()
+    if len(data) <= 75:
+        return text + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1  # não corta caracteres UTF-8 ao meio
+        parts.append(data[start:end].decode())
+        start, limit = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+def ical_event(position: int, athlete: str, week: int, index: int, day: datetime, session, stamp: str) -> str:
+    summary = f"{session.type} - Semana {week}"
+    if athlete:
+        summary = f"{athlete}: {summary}"
+    return "".join((
+        "BEGIN:VEVENT\r\n",
+        # A posição no elenco distingue atletas sem nome ou com o mesmo nome
+        ical_line(f"UID:{day:%Y%m%d}-{week}-{index}-{position}-{uid_part(athlete)}@plano-de-treino"),
+        f"DTSTAMP:{stamp}\r\n",
+        f"DTSTART;VALUE=DATE:{day:%Y%m%d}\r\n",
+        f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}\r\n",
+        ical_line(f"SUMMARY:{ical_escape(summary)}"),
+        ical_line(f"DESCRIPTION:{ical_escape(describe_session(session))}"),
+        "END:VEVENT\r\n",
+    ))
+
+def ical_stream(sessions):
+    # sessions: iterável de (posição, atleta, semana, índice, data, sessão)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield ICAL_HEADER
+    for position, athlete, week, index, day, session in sessions:
+        yield ical_event(position, athlete, week, index, day, session, stamp)
+    yield ICAL_FOOTER
+
+def csv_stream(sessions):
+    # Um único buffer reaproveitado: cada linha é escrita, lida e descartada
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def row(values) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield row(CSV_COLUMNS)
+    for _, athlete, week, index, day, session in sessions:
+        yield row([athlete, week, index + 1, day.strftime("%Y-%m-%d"), session.type,
+                   '' if session.base_distance is None else session.base_distance, describe_session(session)])
+
+EXPORTERS = {
+    'ics': (ical_stream, 'text/calendar'),
+    'csv': (csv_stream, 'text/csv'),
+}
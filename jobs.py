@@ -0,0 +1,231 @@
+# Fila de jobs de geração em lote: os perfis são divididos em blocos
+# guardados num arquivo SQLite local, entregues aos poucos a um pool de
+# processos, e o resultado de cada bloco fica no mesmo arquivo. Se o
+# processo reiniciar, os blocos já concluídos são mantidos e só os
+# pendentes voltam para o pool.
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    status TEXT NOT NULL,
+    total_chunks INTEGER NOT NULL,
+    done_chunks INTEGER NOT NULL DEFAULT 0,
+    options TEXT NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    profiles TEXT NOT NULL,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+class QueueFull(Exception):
+    pass
+
+def pool_context():
+    # fork dentro de um servidor com threads copiaria locks que outra thread
+    # pode estar segurando (cache de planos, SQLite) e o worker travaria;
+    # forkserver e spawn partem de um processo limpo
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+class JobQueue:
+    def __init__(self, path: str, worker: Callable[..., str], processes: Optional[int] = None,
+                 chunk_size: int = 100, max_in_flight: Optional[int] = None, max_queued_chunks: int = 10000,
+                 max_crashes: int = 3):
+        # worker(profiles, options) roda nos processos do pool e devolve o
+        # resultado do bloco já serializado como um array JSON. Todos os blocos
+        # ficam no SQLite; só max_in_flight deles estão no pool ao mesmo tempo
+        # e os seguintes entram conforme as vagas abrem. max_queued_chunks
+        # limita os blocos ainda sem resultado (acima disso, QueueFull). Se um
+        # worker morre, o pool é recriado e os blocos que estavam nele voltam
+        # a ficar pendentes, até max_crashes vezes cada um.
+        self.worker = worker
+        self.chunk_size = chunk_size
+        self.processes = processes or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.processes
+        self.max_queued_chunks = max_queued_chunks
+        self.max_crashes = max_crashes
+        self._in_flight = set()
+        self._crashes = {}
+        self._closed = False
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._pool = self._new_pool()
+        self.resume()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=pool_context())
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        # Chamado por cada bloco que estava no pool quebrado; só o primeiro troca
+        with self._lock:
+            if self._closed or self._pool is not broken:
+                return
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _queued_chunks(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM chunks c JOIN jobs j ON j.id = c.job_id "
+            "WHERE j.status = 'running' AND c.result IS NULL").fetchone()[0]
+
+    def submit(self, profiles: List[list], options: dict) -> str:
+        chunks = [profiles[i:i + self.chunk_size] for i in range(0, len(profiles), self.chunk_size)]
+        if len(chunks) > self.max_queued_chunks:
+            raise ValueError(f"a job can have at most {self.max_queued_chunks * self.chunk_size} profiles")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            queued = self._queued_chunks()
+            if queued + len(chunks) > self.max_queued_chunks:
+                raise QueueFull(f"{queued} chunks already queued")
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO jobs (id, created, status, total_chunks, options) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, time.time(), 'running' if chunks else 'done', len(chunks), json.dumps(options)))
+                self._db.executemany(
+                    "INSERT INTO chunks (job_id, idx, profiles) VALUES (?, ?, ?)",
+                    [(job_id, idx, json.dumps(chunk)) for idx, chunk in enumerate(chunks)])
+
+        self._fill()
+        return job_id
+
+    def resume(self):
+        # Os blocos sem resultado dos jobs que não terminaram voltam para o
+        # pool conforme houver vaga
+        self._fill()
+
+    def _fill(self):
+        # Entrega ao pool os próximos blocos pendentes, na ordem de envio
+        with self._lock:
+            if self._closed:
+                return
+            free = self.max_in_flight - len(self._in_flight)
+            if free <= 0:
+                return
+            rows = self._db.execute(
+                "SELECT c.job_id, c.idx, c.profiles, j.options FROM chunks c JOIN jobs j ON j.id = c.job_id "
+                "WHERE j.status = 'running' AND c.result IS NULL ORDER BY j.created, c.job_id, c.idx LIMIT ?",
+                (len(self._in_flight) + free,)).fetchall()
+            rows = [row for row in rows if (row[0], row[1]) not in self._in_flight][:free]
+            self._in_flight.update((job_id, idx) for job_id, idx, _, _ in rows)
+            pool = self._pool
+
+        for position, (job_id, idx, profiles, options) in enumerate(rows):
+            try:
+                future = pool.submit(self.worker, json.loads(profiles), json.loads(options))
+            except RuntimeError as e:
+                # Pool encerrado ou quebrado: os blocos não entregues saem de
+                # _in_flight e ficam pendentes no SQLite
+                with self._lock:
+                    self._in_flight.difference_update((job_id, idx) for job_id, idx, _, _ in rows[position:])
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_pool(pool)
+                    self._fill()
+                return
+            future.add_done_callback(lambda f, job_id=job_id, idx=idx: self._complete(job_id, idx, f, pool))
+
+    def _complete(self, job_id: str, idx: int, future, pool: ProcessPoolExecutor):
+        with self._lock:
+            self._in_flight.discard((job_id, idx))
+            if self._closed or future.cancelled():
+                return  # fila encerrada; o bloco fica pendente para o resume()
+            error = future.exception()
+            crashed = isinstance(error, BrokenProcessPool)
+            crashes = self._crashes.pop((job_id, idx), 0) + crashed
+            if crashed and crashes < self.max_crashes:
+                # Um worker morreu: o bloco continua pendente e volta no pool novo
+                self._crashes[(job_id, idx)] = crashes
+            else:
+                with self._db:
+                    if error is not None:
+                        self._db.execute("UPDATE jobs SET status = 'failed', error = ? WHERE id = ?",
+                                         (f"chunk {idx}: {error!r}", job_id))
+                    else:
+                        self._db.execute("UPDATE chunks SET result = ? WHERE job_id = ? AND idx = ?",
+                                         (future.result(), job_id, idx))
+                        self._db.execute(
+                            "UPDATE jobs SET done_chunks = done_chunks + 1, "
+                            "status = CASE WHEN status = 'running' AND done_chunks + 1 = total_chunks THEN 'done' ELSE status END "
+                            "WHERE id = ?", (job_id,))
+        if crashed:
+            self._replace_pool(pool)
+        self._fill()
+
+    def status(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, total_chunks, done_chunks, created, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        status, total_chunks, done_chunks, created, error = row
+        return {
+            'id': job_id,
+            'status': status,
+            'total_chunks': total_chunks,
+            'done_chunks': done_chunks,
+            'progress': done_chunks / total_chunks if total_chunks else 1.0,
+            'created': created,
+            'error': error
+        }
+
+    def results(self, job_id: str, poll_interval: float = 0.2) -> Iterator[tuple]:
+        # Entrega (índice, resultado) na ordem dos blocos, esperando pelos que faltam
+        idx = 0
+        while True:
+            with self._lock:
+                row = self._db.execute("SELECT result FROM chunks WHERE job_id = ? AND idx = ?", (job_id, idx)).fetchone()
+                status = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or status is None:
+                return
+            if row[0] is not None:
+                yield idx, row[0]
+                idx += 1
+            elif status[0] != 'running':
+                return
+            else:
+                time.sleep(poll_interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            return {
+                'queued_chunks': self._queued_chunks(),
+                'max_queued_chunks': self.max_queued_chunks,
+                'in_flight': len(self._in_flight),
+                'max_in_flight': self.max_in_flight,
+                'jobs': counts
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._db.close()
+
+def job_queue_from_env(worker: Callable[..., str]) -> JobQueue:
+    return JobQueue(
+        os.environ.get('JOBS_DB', 'jobs.sqlite3'),
+        worker,
+        processes=int(os.environ['JOBS_WORKERS']) if 'JOBS_WORKERS' in os.environ else None,
+        chunk_size=int(os.environ.get('JOBS_CHUNK_SIZE', 100)),
+        max_in_flight=int(os.environ['JOBS_MAX_IN_FLIGHT']) if 'JOBS_MAX_IN_FLIGHT' in os.environ else None,
+        max_queued_chunks=int(os.environ.get('JOBS_MAX_QUEUED_CHUNKS', 10000))
+    )
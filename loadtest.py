@@ -0,0 +1,261 @@
+"""Gerador de carga que reproduz pedidos gravados pelo app.py.
+
+    RECORD_REQUESTS=recorded_requests.jsonl RECORD_SAMPLE_RATE=0.1 python app.py
+    python loadtest.py replay recorded_requests.jsonl --concurrency 8 --rate 50 --output before.json
+    python loadtest.py replay recorded_requests.jsonl --url http://127.0.0.1:5001 --speed 2 --output after.json
+    python loadtest.py compare before.json after.json --threshold 10
+
+Sem --url os pedidos vão direto para o app Flask em processo; com --url,
+para um servidor já rodando (por exemplo `gunicorn -w 4 -b 127.0.0.1:5001
+app:app`). --rate fixa a taxa de envio, --speed reproduz o espaçamento
+original dos timestamps gravados (2 = duas vezes mais rápido) e, sem
+nenhum dos dois, cada worker envia o próximo pedido assim que o anterior
+termina. Com taxa definida a latência é medida a partir do horário
+previsto de envio, para que um servidor lento não esconda a própria fila.
+
+`compare` termina com código 1 se a vazão cair, algum percentil de
+latência subir ou a taxa de erros aumentar além do percentual informado.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+def load_requests(path: str, limit: Optional[int] = None) -> List[dict]:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if 'path' in entry:  # ignora linhas que não foram gravadas pelo app.py
+                entries.append(entry)
+            if limit is not None and len(entries) >= limit:
+                break
+    return entries
+
+def schedule(entries: List[dict], rate: Optional[float], speed: Optional[float]) -> List[Optional[float]]:
+    # Segundos desde o início em que cada pedido deve sair (None: assim que possível)
+    if rate:
+        return [i / rate for i in range(len(entries))]
+    if speed:
+        first = entries[0]['ts'] if entries else 0
+        return [(entry['ts'] - first) / speed for entry in entries]
+    return [None] * len(entries)
+
+def target_path(entry: dict) -> str:
+    return entry['path'] + ('?' + entry['query'] if entry.get('query') else '')
+
+def request_body(entry: dict) -> tuple:
+    # (corpo, cabeçalhos) exatamente como gravados; arquivos gravados antes
+    # do corpo bruto guardavam o JSON já decodificado
+    headers = {'Accept': entry['accept']} if entry.get('accept') else {}
+    body = entry.get('body')
+    if body is None:
+        return None, headers
+    if not isinstance(body, str):
+        body, headers['Content-Type'] = json.dumps(body), 'application/json'
+    elif entry.get('content_type'):
+        headers['Content-Type'] = entry['content_type']
+    return body.encode(), headers
+
+def in_process_sender():
+    from app import app
+    local = threading.local()
+
+    def send(entry: dict) -> int:
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        body, headers = request_body(entry)
+        response = client.open(target_path(entry), method=entry['method'], data=body, headers=headers)
+        response.get_data()  # consome respostas em streaming
+        return response.status_code
+
+    return send
+
+def http_sender(url: str):
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    prefix = parts.path.rstrip('/')
+    local = threading.local()
+
+    def send(entry: dict) -> int:
+        # Uma conexão keep-alive por worker, refeita após erros
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = connection_class(parts.netloc, timeout=60)
+        body, headers = request_body(entry)
+        try:
+            connection.request(entry['method'], prefix + target_path(entry), body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            connection.close()
+            local.connection = None
+            raise
+
+    return send
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def replay(entries: List[dict], send, concurrency: int, offsets: List[Optional[float]]) -> dict:
+    work = queue.Queue()
+    for item in zip(entries, offsets):
+        work.put(item)
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def worker():
+        while True:
+            try:
+                entry, offset = work.get_nowait()
+            except queue.Empty:
+                return
+            if offset is not None:
+                scheduled = start + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+            try:
+                status = str(send(entry))
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - scheduled
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    total = len(latencies)
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'duration_s': duration,
+        'throughput_rps': total / duration if duration else 0.0,
+        'latency_ms': {
+            'mean': sum(latencies) / total * 1000 if total else 0.0,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': latencies[-1] * 1000 if latencies else 0.0,
+        },
+        'errors': errors,
+        'error_rate': errors / total if total else 0.0,
+        'statuses': dict(statuses),
+    }
+
+def print_report(result: dict):
+    latency = result['latency_ms']
+    print(f"requests      {result['requests']:10d}  ({result['concurrency']} workers, {result['duration_s']:.2f} s)")
+    print(f"throughput    {result['throughput_rps']:10.1f} req/s")
+    for key in ('mean', 'p50', 'p95', 'p99', 'max'):
+        print(f"latency/{key:5s} {latency[key]:10.3f} ms")
+    print(f"errors        {result['errors']:10d}  ({result['error_rate']:.2%})")
+    print("statuses      " + ", ".join(f"{status}: {count}" for status, count in sorted(result['statuses'].items())))
+
+def run_replay(args) -> int:
+    entries = load_requests(args.file, args.limit)
+    if not entries:
+        print(f"no recorded requests in {args.file}")
+        return 1
+    if args.speed and args.repeat > 1:
+        print("--speed replays the recorded timestamps and cannot be combined with --repeat")
+        return 1
+    entries = entries * args.repeat
+    send = http_sender(args.url) if args.url else in_process_sender()
+    result = replay(entries, send, args.concurrency, schedule(entries, args.rate, args.speed))
+    result['target'] = args.url or 'in-process'
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    return 0
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    limit = args.threshold / 100
+    regressions = []
+
+    def check(name: str, old: float, new: float, higher_is_worse: bool = True):
+        change = (new - old) / old if old else 0.0
+        worse = change > limit if higher_is_worse else -change > limit
+        if worse:
+            regressions.append(name)
+        print(f"{name:20s} {old:12.3f} -> {new:12.3f}  {change:+8.1%}  {'REGRESSION' if worse else 'ok'}")
+
+    check('throughput_rps', baseline['throughput_rps'], current['throughput_rps'], higher_is_worse=False)
+    for key in ('p50', 'p95', 'p99'):
+        check(f'latency/{key}_ms', baseline['latency_ms'][key], current['latency_ms'][key])
+    # Taxa de erros comparada em pontos percentuais, já que o baseline costuma ser 0
+    error_change = current['error_rate'] - baseline['error_rate']
+    error_worse = error_change * 100 > args.threshold
+    if error_worse:
+        regressions.append('error_rate')
+    print(f"{'error_rate':20s} {baseline['error_rate']:12.2%} -> {current['error_rate']:12.2%}  "
+          f"{error_change * 100:+7.1f}pp  {'REGRESSION' if error_worse else 'ok'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed beyond {args.threshold}%")
+        return 1
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = commands.add_parser('replay', help="reproduz um arquivo de pedidos gravados")
+    replay_parser.add_argument('file', help="JSONL gravado com RECORD_REQUESTS")
+    replay_parser.add_argument('--url', help="servidor alvo; sem ele usa o app em processo")
+    replay_parser.add_argument('--concurrency', type=int, default=4)
+    pacing = replay_parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, help="pedidos por segundo")
+    pacing.add_argument('--speed', type=float, help="multiplicador do ritmo gravado")
+    replay_parser.add_argument('--limit', type=int, help="usa só os primeiros N pedidos do arquivo")
+    replay_parser.add_argument('--repeat', type=int, default=1, help="reproduz o arquivo N vezes")
+    replay_parser.add_argument('--output', help="arquivo JSON onde salvar o resultado")
+
+    compare_parser = commands.add_parser('compare', help="compara dois resultados")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="regressão máxima aceita, em %%")
+
+    args = parser.parse_args()
+    return {'replay': run_replay, 'compare': compare}[args.command](args)
+
+if __name__ == '__main__':
+    sys.exit(main())
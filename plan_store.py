@@ -0,0 +1,153 @@
+# Armazenamento persistente de planos já gerados (SQLite local). Cada plano
+# é guardado já serializado, pela hash canônica dos parâmetros, e servido
+# com uma única leitura indexada. Planos de outra versão do gerador são
+# descartados ao abrir o arquivo, e acima de max_bytes os mais antigos saem
+# primeiro (os sem atleta vinculado antes dos demais).
+#
+#     python plan_store.py plans.sqlite3 --start-dates 04/03/2024,11/03/2024 \
+#         --paces 240-420:15 --weeks 6,12,24 --distances 5,10,21.1,42.2
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    params TEXT NOT NULL,
+    body BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS athlete_plans (
+    athlete_id TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    key TEXT NOT NULL REFERENCES plans (key) ON DELETE CASCADE,
+    PRIMARY KEY (athlete_id, start_date, key)
+);
+"""
+
+# Upsert em vez de INSERT OR REPLACE: o REPLACE apaga a linha antiga e, com
+# foreign_keys ligadas, o ON DELETE CASCADE levaria junto os vínculos de atletas
+UPSERT = """
+INSERT INTO plans (key, version, params, body, created) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET version = excluded.version, params = excluded.params,
+    body = excluded.body, created = excluded.created
+"""
+
+def plan_key(params: list) -> str:
+    return hashlib.sha256(json.dumps(params, separators=(',', ':')).encode()).hexdigest()
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Candidatos à remoção: primeiro os planos sem atleta, depois os mais antigos
+EVICTION_ORDER = """
+SELECT key, LENGTH(body) FROM plans
+ORDER BY key IN (SELECT key FROM athlete_plans), created LIMIT 100
+"""
+
+class PlanStore:
+    def __init__(self, path: str, version: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+        with self._db:
+            self._db.execute("DELETE FROM plans WHERE version != ?", (version,))
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM plans").fetchone()[0]
+        with self._lock, self._db:
+            self._evict()
+
+    def _stored_size(self, key: str) -> int:
+        row = self._db.execute("SELECT LENGTH(body) FROM plans WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _evict(self):
+        # Chamado com o lock e dentro da transação de quem escreveu
+        while self._bytes > self.max_bytes:
+            rows = self._db.execute(EVICTION_ORDER).fetchall()
+            if not rows:
+                return
+            for key, size in rows:
+                self._db.execute("DELETE FROM plans WHERE key = ?", (key,))
+                self._bytes -= size
+                self.evicted += 1
+                if self._bytes <= self.max_bytes:
+                    return
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT body FROM plans WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, params: list, body: bytes):
+        with self._lock, self._db:
+            self._bytes += len(body) - self._stored_size(key)
+            self._db.execute(UPSERT, (key, self.version, json.dumps(params), body, time.time()))
+            self._evict()
+
+    def link(self, athlete_id: str, start_date: str, key: str):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO athlete_plans (athlete_id, start_date, key) VALUES (?, ?, ?)",
+                             (athlete_id, start_date, key))
+
+    def put_many(self, entries: Iterable[tuple]) -> int:
+        # Importação em massa: (key, params, body), numa única transação
+        rows = [(key, self.version, json.dumps(params), body, time.time()) for key, params, body in entries]
+        with self._lock, self._db:
+            for row in rows:
+                self._bytes += len(row[3]) - self._stored_size(row[0])
+                self._db.execute(UPSERT, row)
+            self._evict()
+        return len(rows)
+
+    def athlete_plan(self, athlete_id: str, start_date: Optional[str] = None) -> Optional[bytes]:
+        # Plano mais recente do atleta (ou o da start_date pedida)
+        query = ("SELECT p.body FROM athlete_plans a JOIN plans p ON p.key = a.key WHERE a.athlete_id = ?"
+                 + (" AND a.start_date = ?" if start_date else "") + " ORDER BY p.created DESC LIMIT 1")
+        with self._lock:
+            row = self._db.execute(query, (athlete_id, start_date) if start_date else (athlete_id,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            plans = self._db.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+            athletes = self._db.execute("SELECT COUNT(DISTINCT athlete_id) FROM athlete_plans").fetchone()[0]
+            return {'version': self.version, 'plans': plans, 'athletes': athletes,
+                    'bytes': self._bytes, 'max_bytes': self.max_bytes, 'evicted': self.evicted}
+
+def parse_range(text: str) -> List[int]:
+    # "240-420:15" -> 240, 255, ..., 420; "270,300" -> 270, 300
+    if '-' in text:
+        bounds, _, step = text.partition(':')
+        start, end = map(int, bounds.split('-'))
+        return list(range(start, end + 1, int(step or 1)))
+    return [int(value) for value in text.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-calcula a grade de parâmetros mais comum no armazenamento de planos")
+    parser.add_argument('db')
+    parser.add_argument('--start-dates', required=True, help="datas DD/MM/YYYY separadas por vírgula")
+    parser.add_argument('--paces', default='240-420:15', help="paces em segundos: início-fim:passo ou lista")
+    parser.add_argument('--weeks', default='6,12,24')
+    parser.add_argument('--distances', default='5,10,21.1,42.2')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES,
+                        help="tamanho máximo dos planos guardados; acima disso os mais antigos saem")
+    args = parser.parse_args()
+
+    import app
+    store = PlanStore(args.db, app.GENERATOR_VERSION, args.max_bytes)
+    count = store.put_many(app.precompute_plans(
+        args.start_dates.split(','), parse_range(args.paces), parse_range(args.weeks),
+        [float(distance) for distance in args.distances.split(',')]))
+    print(f"{count} plans stored in {args.db} (generator {app.GENERATOR_VERSION}, {store.evicted} evicted)")
+
+if __name__ == '__main__':
+    main()
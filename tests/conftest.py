@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def client():
+    import app
+    app.plan_cache.clear()
+    return app.app.test_client()
@@ -0,0 +1,302 @@
+import pytest
+
+PROFILE = {'minutes': 5, 'seconds': 0, 'start_date': '01/03/2024', 'num_weeks': 8, 'base_distance': 10}
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'profiles': [{'minutes': 4}]},
+    {'profiles': [{'minutes': 'x', 'seconds': 0}]},
+    {'profiles': [dict(PROFILE, start_date='bad')]},
+    {'profiles': [PROFILE], 'sessions': 'false'},
+    {'profiles': [PROFILE], 'sessions': 0},
+])
+def test_batch_rejects_invalid_profiles(client, body):
+    response = client.post('/calculate/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_batch_generates_plans(client):
+    response = client.post('/calculate/batch', json={'profiles': [PROFILE, dict(PROFILE, minutes=4)]})
+    assert response.status_code == 200
+    assert len(response.get_json()['plans']) == 2
+
+def test_batch_dates_fit_each_start_date(client):
+    profiles = [dict(PROFILE, start_date='01/06/9999', num_weeks=1), dict(PROFILE, start_date='01/01/2024', num_weeks=40)]
+    response = client.post('/calculate/batch', json={'profiles': profiles})
+    assert response.status_code == 200
+    plans = response.get_json()['plans']
+    assert plans[0]['plan']['Semana 1'][3]['date'] == '07/06'
+    assert len(plans[1]['plan']) == 40
+
+def test_batch_without_sessions_returns_week_rows(client):
+    response = client.post('/calculate/batch', json={'profiles': [PROFILE], 'sessions': False})
+    assert response.status_code == 200
+    plan = response.get_json()['plans'][0]
+    assert 'plan' not in plan and len(plan['weeks']) == PROFILE['num_weeks']
+
+def test_plan_cache_bounds_cached_weeks():
+    from app import PlanCache
+    cache = PlanCache(maxsize=10, max_weeks=100)
+    cache.put('too-long', [[]] * 101)
+    assert cache.get('too-long') is None
+    for i in range(5):
+        cache.put(i, [[]] * 40)
+    assert cache.stats()['weeks'] <= 100
+    assert cache.get(4) is not None and cache.get(0) is None
+    cache.put(4, [[]] * 10)
+    assert cache.stats()['weeks'] == 50
+
+@pytest.mark.parametrize('query', ['stream=1', ''])
+def test_calculate_rejects_bad_start_date_before_streaming(client, query):
+    response = client.get(f'/calculate?minutes=5&seconds=0&start_date=bad&num_weeks=4&{query}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Invalid date format. Use DD/MM/YYYY"}
+
+def test_stream_sends_header_and_one_line_per_week(client):
+    response = client.get('/calculate?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4&stream=1')
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 5
+
+def test_plan_weeks_rejects_bad_start_date(client):
+    response = client.get('/plan?minutes=5&seconds=0&start_date=31/02/2024&num_weeks=8&from_week=2&to_week=3')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Invalid date format. Use DD/MM/YYYY"}
+
+@pytest.mark.parametrize('text', ['01/01/24', '1_0/1/2024', '01/01/+2024', ' 1/01/2024', '01/13/2024', '٠١/٠١/٢٠٢٤'])
+def test_parse_date_rejects_what_strptime_rejects(text):
+    from app import parse_date
+    with pytest.raises(ValueError):
+        parse_date(text)
+
+def test_parse_date_matches_strptime():
+    from datetime import datetime
+    from app import parse_date
+    for text in ['1/3/2024', '01/03/2024', '29/02/2024', '31/12/0999']:
+        assert parse_date(text) == datetime.strptime(text, "%d/%m/%Y")
+
+@pytest.mark.parametrize('start_date', ['01/01/24', '1_0/1/2024', '01/01/+2024'])
+def test_v4_rejects_malformed_dates(client, start_date):
+    response = client.post('/v4/calculate', json={'time5k': 1350, 'startDate': start_date, 'numWeeks': 4})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('start_date', ['bad', '31/02/2024'])
+def test_replan_rejects_bad_start_date(client, start_date):
+    body = dict(PROFILE, start_date=start_date, new_minutes=4, new_seconds=50, from_week=5)
+    response = client.post('/replan', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Invalid date format. Use DD/MM/YYYY"}
+
+@pytest.mark.parametrize('base_distance', ['nan', 'inf', '-inf', '0', '-5'])
+def test_calculate_rejects_non_finite_or_non_positive_distance(client, base_distance):
+    response = client.get(f'/calculate?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4&base_distance={base_distance}')
+    assert response.status_code == 400
+    assert 'base_distance' in response.get_json()['error']
+
+def test_batch_without_sessions_is_charged_per_week(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'PLAN_BATCH_COST_BUDGET', 1000)
+    profiles = [dict(PROFILE, num_weeks=100)] * 5
+    assert client.post('/calculate/batch', json={'profiles': profiles, 'sessions': False}).status_code == 200
+    assert client.post('/calculate/batch', json={'profiles': profiles}).status_code == 413
+
+def test_default_batch_budget_admits_thousands_of_athletes(client):
+    numeric = client.post('/calculate/batch', json={'profiles': [PROFILE] * 2000, 'sessions': False})
+    assert numeric.status_code == 200
+    assert len(numeric.get_json()['plans']) == 2000
+    six_weeks = dict(PROFILE, num_weeks=6)
+    assert client.post('/calculate/batch', json={'profiles': [six_weeks] * 100}).status_code == 200
+
+def test_roster_export_uses_its_own_budget(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'PLAN_EXPORT_COST_BUDGET', app.plan_cost(10))
+    athletes = [dict(PROFILE, name='ana'), dict(PROFILE, name='bia')]
+    assert client.post('/roster/export.csv', json={'athletes': athletes}).status_code == 413
+    assert client.post('/roster/export.csv', json={'athletes': athletes[:1]}).status_code == 200
+
+def test_rate_limit_ignores_spoofed_forwarded_for(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'RATE_LIMIT_PER_SECOND', 0.001)
+    monkeypatch.setattr(app, 'rate_limiter', app.TokenBucketLimiter(0.001, 0))
+    url = '/calculate?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4'
+    assert client.get(url, headers={'X-Forwarded-For': '10.0.0.1'}).status_code == 200
+    response = client.get(url, headers={'X-Forwarded-For': '10.0.0.2'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After']
+
+def test_replan_only_returns_sessions_that_change(client):
+    body = dict(PROFILE, new_minutes=4, new_seconds=50, from_week=5)
+    changes = client.post('/replan', json=body).get_json()['changes']
+    assert len(changes) == 12
+    assert not any(change['session']['type'] == 'Regenerativo' for change in changes)
+
+@pytest.mark.parametrize('new_minutes, new_seconds', [(-5, 0), (0, 0), (0, -30)])
+def test_replan_rejects_non_positive_new_pace(client, new_minutes, new_seconds):
+    body = dict(PROFILE, new_minutes=new_minutes, new_seconds=new_seconds, from_week=5)
+    response = client.post('/replan', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "'new_minutes' and 'new_seconds' should give a positive pace"}
+
+@pytest.mark.parametrize('query', [
+    'minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4&base_distance=-5',
+    'minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4&base_distance=inf',
+    'minutes=0&seconds=0&start_date=01/03/2024&num_weeks=4',
+    'time5k=-5&startDate=01/03/2024&numWeeks=4',
+    'time5k=1350&startDate=01/03/2024&numWeeks=0',
+    'time5k=1350&startDate=01/01/24&numWeeks=4',
+])
+def test_summary_validates_like_calculate(client, query):
+    response = client.get(f'/summary?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_summary_totals_match_sessions(client):
+    body = client.get('/summary?time5k=1350&startDate=01/03/2024&numWeeks=4').get_json()
+    assert body['total']['km'] == pytest.approx(sum(week['km'] for week in body['weeks']), abs=0.05)
+
+def test_summary_counts_threshold_runs_in_the_threshold_zone(client):
+    body = client.get('/summary?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=6').get_json()
+    assert set(body['total']['zones']) == {'very_fast', 'fast', 'threshold', 'easy'}
+    limiar = body['weeks'][1]['sessions'][2]
+    assert limiar['type'] == 'Limiar'
+    assert set(limiar['zones']) == {'threshold'}
+
+@pytest.mark.parametrize('path, body', [
+    ('/calculate', {'minutes': None, 'seconds': 0}),
+    ('/calculate', dict(PROFILE, base_distance=None)),
+    ('/calculate', [1]),
+    ('/replan', dict(PROFILE, new_minutes=None, new_seconds=0, from_week=3)),
+    ('/replan', [1]),
+    ('/jobs', {'profiles': [dict(PROFILE, num_weeks=None)]}),
+    ('/jobs', [1]),
+    ('/roster/export.ics', {'athletes': [None]}),
+    ('/roster/export.csv', {'athletes': [1]}),
+    ('/roster/export.csv', [1]),
+])
+def test_null_fields_and_non_object_bodies_are_rejected(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+@pytest.mark.parametrize('query', [
+    '/plan?minutes=5&seconds=0&start_date=01/03/2024&from_week=500000&to_week=500001',
+    '/plan?minutes=5&seconds=0&start_date=01/03/2024&from_week=7&to_week=7',
+    '/calculate?minutes=5&seconds=0&start_date=01/01/9999&num_weeks=60',
+    '/summary?time5k=1350&startDate=01/01/9999&numWeeks=60',
+])
+def test_weeks_past_the_plan_or_the_calendar_are_rejected(client, query):
+    response = client.get(query)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+CALCULATE = '/calculate?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4&base_distance=10'
+
+@pytest.mark.parametrize('accept_encoding, weak', [('identity', False), ('gzip', True)])
+def test_not_modified_carries_the_same_etag_as_the_full_response(client, accept_encoding, weak):
+    headers = {'Accept-Encoding': accept_encoding}
+    first = client.get(CALCULATE, headers=headers)
+    assert first.status_code == 200
+    assert first.headers['ETag'].startswith('W/') == weak
+
+    second = client.get(CALCULATE, headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert second.status_code == 304
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.get_data() == b''
+
+def test_cacheable_plans_are_cached_by_the_cdn(client):
+    cache_control = client.get(CALCULATE).headers['Cache-Control']
+    assert 'public' in cache_control and 's-maxage=' in cache_control and 'max-age=' in cache_control
+    assert 'no-cache' in client.get('/calculate?minutes=5&seconds=0&num_weeks=4').headers['Cache-Control']
+
+def test_gzip_body_decompresses_to_the_identity_body(client):
+    import gzip
+    plain = client.get(CALCULATE, headers={'Accept-Encoding': 'identity'})
+    compressed = client.get(CALCULATE, headers={'Accept-Encoding': 'gzip'})
+    assert plain.headers.get('Content-Encoding') is None
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+
+def stage_count(stage: str) -> int:
+    import app
+    series = app.STAGE_SECONDS._series.get(stage)
+    return series[1] if series else 0
+
+@pytest.mark.parametrize('method, path, body', [
+    ('GET', '/calculate?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4&stream=1', None),
+    ('POST', '/roster/export.csv', {'athletes': [PROFILE]}),
+])
+def test_streamed_responses_record_generation_after_the_body(client, method, path, body):
+    before = stage_count('generate')
+    response = client.open(path, method=method, json=body)
+    response.get_data()
+    response.close()
+    assert stage_count('generate') == before + 1
+
+def test_server_timing_lists_stages_and_total(client):
+    header = client.get(CALCULATE).headers['Server-Timing']
+    stages = dict(item.split(';dur=') for item in header.split(', '))
+    assert {'parse', 'generate', 'serialize', 'total'} <= set(stages)
+    assert all(float(duration) >= 0 for duration in stages.values())
+    assert float(stages['total']) >= float(stages['generate'])
+
+def test_metrics_renders_prometheus_histograms(client):
+    client.get(CALCULATE)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE plan_stage_duration_seconds histogram' in text
+    assert 'plan_stage_duration_seconds_bucket{stage="generate",le="+Inf"}' in text
+    assert 'plan_weeks_count ' in text and 'plan_response_bytes_sum ' in text
+
+def test_metrics_is_loopback_only(client):
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '::1'}).status_code == 200
+    response = client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert response.status_code == 404
+
+def test_sampled_requests_log_a_profile(client, monkeypatch):
+    import app
+    messages = []
+    monkeypatch.setattr(app.app.logger, 'info', lambda message, *args: messages.append(message % args))
+    monkeypatch.setattr(app, 'PROFILE_SAMPLE_RATE', 1.0)
+    client.get(CALCULATE)
+    response = client.get('/calculate?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4&stream=1')
+    response.get_data()
+    response.close()
+    assert len(messages) == 2
+    assert messages[0].startswith('Perfil de GET /calculate')
+    assert 'generate_week' in messages[1]  # o perfil do streaming inclui a geração
+
+    monkeypatch.setattr(app, 'PROFILE_SAMPLE_RATE', 0.0)
+    client.get(CALCULATE)
+    assert len(messages) == 2
+
+def drop_empty(value):
+    # O que omit_empty deveria produzir a partir da forma completa
+    if isinstance(value, dict):
+        return {key: drop_empty(item) for key, item in value.items() if item is not None and item != []}
+    if isinstance(value, list):
+        return [drop_empty(item) for item in value]
+    return value
+
+def test_omit_empty_drops_nulls_and_empty_activity_lists(client):
+    import json
+    import app
+    plan = app.generate_training_plan(app.Pace(300), '01/03/2024', 8, 10.0)
+    full = json.loads(app.encode_plan(plan))
+    compact_text = app.encode_plan(plan, omit_empty=True)
+    assert 'null' not in compact_text and '"activities":[]' not in compact_text
+    assert json.loads(compact_text) == drop_empty(full)
+
+    response = client.get(CALCULATE + '&omit_empty=1')
+    assert response.get_json() == drop_empty(client.get(CALCULATE).get_json())
+
+def test_plan_week_range_matches_the_full_plan(client):
+    profile = 'minutes=5&seconds=0&start_date=01/03/2024&num_weeks=18&base_distance=10'
+    full = client.get(f'/calculate?{profile}').get_json()['plan']
+    response = client.get(f'/plan?{profile}&from_week=13&to_week=15')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['from_week'], body['to_week']) == (13, 15)
+    assert body['plan'] == {f'Semana {week}': full[f'Semana {week}'] for week in (13, 14, 15)}
+    assert body['plan']['Semana 13'][0]['date'] == full['Semana 13'][0]['date'] == '05/06'
@@ -0,0 +1,36 @@
+import csv
+import io
+
+PROFILE = {'minutes': 5, 'seconds': 0, 'start_date': '01/03/2024', 'num_weeks': 1, 'base_distance': 10}
+
+def unfold(text: str) -> list:
+    return text.replace("\r\n ", "").split("\r\n")
+
+def test_ics_uids_are_unique_for_unnamed_and_repeated_athletes(client):
+    athletes = [PROFILE, PROFILE, dict(PROFILE, name='Ana'), dict(PROFILE, name='Ana')]
+    response = client.post('/roster/export.ics', json={'athletes': athletes})
+    assert response.status_code == 200
+    uids = [line for line in unfold(response.get_data(as_text=True)) if line.startswith('UID:')]
+    assert len(uids) == 16
+    assert len(set(uids)) == 16
+
+def test_ics_lines_are_folded_at_75_octets(client):
+    athlete = dict(PROFILE, name='Atleta com um nome bem comprido, acentuação e çedilha ' * 3)
+    body = client.post('/roster/export.ics', json={'athletes': [athlete]}).get_data()
+    lines = body.split(b"\r\n")
+    assert any(line.startswith(b" ") for line in lines)
+    assert all(len(line) <= 75 for line in lines)
+    for line in lines:
+        line.decode()  # nenhum caractere UTF-8 cortado ao meio
+    summary = 'SUMMARY:' + athlete['name'].replace(',', '\\,') + ': Regenerativo - Semana 1'
+    assert summary in unfold(body.decode())
+
+def test_csv_has_one_row_per_session(client):
+    athletes = [dict(PROFILE, name='Ana'), dict(PROFILE, num_weeks=2)]
+    response = client.post('/roster/export.csv', json={'athletes': athletes})
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ['athlete', 'week', 'session', 'date', 'type', 'base_distance', 'activities']
+    assert len(rows) == 1 + 4 + 8
+    assert rows[1][:4] == ['Ana', '1', '1', '2024-03-01']
+    assert rows[-1][:4] == ['', '2', '4', '2024-03-15']
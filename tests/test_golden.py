@@ -0,0 +1,16 @@
+import json
+import os
+
+import pytest
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+# Planos completos gerados pelo código anterior aos templates de sessão.
+# Uma mudança nos templates que altere o plano precisa regravar estes arquivos.
+@pytest.mark.parametrize('name', sorted(os.listdir(GOLDEN_DIR)))
+def test_plan_matches_golden_output(client, name):
+    with open(os.path.join(GOLDEN_DIR, name), encoding='utf-8') as f:
+        golden = json.load(f)
+    response = client.post(golden['path'], json=golden['request'])
+    assert response.status_code == 200
+    assert response.get_json() == golden['response']
@@ -0,0 +1,122 @@
+import json
+import os
+import signal
+import time
+
+import pytest
+
+import app
+from jobs import JobQueue, QueueFull
+
+FAST = [270, '01/03/2024', 4, 10.0]
+SLOW = [270, '01/03/2024', 3000, 10.0]  # alguns décimos de segundo por bloco
+OPTIONS = {'sessions': True, 'omit_empty': False}
+
+def crash_once(profiles, options):
+    # Worker que derruba o próprio processo na primeira chamada
+    if not os.path.exists(options['marker']):
+        open(options['marker'], 'w').close()
+        os.kill(os.getpid(), signal.SIGKILL)
+    return app.generate_job_chunk(profiles, options)
+
+def always_crash(profiles, options):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+def wait_for(queue: JobQueue, job_id: str, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = queue.status(job_id)
+        if status['status'] != 'running':
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still running after {timeout}s")
+
+def test_job_larger_than_in_flight_window_completes(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), app.generate_job_chunk, processes=1, chunk_size=1,
+                     max_in_flight=2, max_queued_chunks=100)
+    try:
+        profiles = [[240 + i, '01/03/2024', 2, 10.0] for i in range(10)]
+        job_id = queue.submit(profiles, OPTIONS)
+        assert queue.stats()['in_flight'] <= 2
+        assert wait_for(queue, job_id)['status'] == 'done'
+        results = list(queue.results(job_id))
+        assert [idx for idx, _ in results] == list(range(10))
+        assert results[3][1] == app.generate_job_chunk([profiles[3]], OPTIONS)
+    finally:
+        queue.shutdown()
+
+def test_queue_full_and_job_too_large(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), app.generate_job_chunk, processes=1, chunk_size=1,
+                     max_in_flight=1, max_queued_chunks=3)
+    try:
+        with pytest.raises(ValueError):
+            queue.submit([FAST] * 4, OPTIONS)
+        queue.submit([SLOW] * 3, OPTIONS)
+        with pytest.raises(QueueFull):
+            queue.submit([FAST], OPTIONS)
+        assert queue.stats()['queued_chunks'] == 3
+    finally:
+        queue.shutdown()
+
+def test_unfinished_chunks_resume_after_restart(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    queue = JobQueue(path, app.generate_job_chunk, processes=1, chunk_size=1, max_in_flight=1)
+    job_id = queue.submit([SLOW, FAST, FAST], OPTIONS)
+    queue.shutdown()  # simula a queda do processo com blocos pendentes
+
+    restarted = JobQueue(path, app.generate_job_chunk, processes=1, chunk_size=1, max_in_flight=1)
+    try:
+        assert wait_for(restarted, job_id)['status'] == 'done'
+        results = [json.loads(result) for _, result in restarted.results(job_id)]
+        assert len(results) == 3 and all(len(plans) == 1 for plans in results)
+    finally:
+        restarted.shutdown()
+
+def test_jobs_endpoint_answers_429_when_queue_is_full(tmp_path, client, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), app.generate_job_chunk, processes=1, chunk_size=1,
+                     max_in_flight=1, max_queued_chunks=1)
+    monkeypatch.setattr(app, 'job_queue', queue)
+    try:
+        slow = {'minutes': 4, 'seconds': 30, 'start_date': '01/03/2024', 'num_weeks': 400}
+        assert client.post('/jobs', json={'profiles': [slow]}).status_code == 202
+        response = client.post('/jobs', json={'profiles': [slow]})
+        assert response.status_code == 429
+        assert response.headers['Retry-After']
+    finally:
+        queue.shutdown()
+
+def test_jobs_endpoint_rejects_bad_start_date(client):
+    response = client.post('/jobs', json={'profiles': [{'minutes': 4, 'seconds': 30, 'start_date': '2024-03-01'}]})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Invalid date format. Use DD/MM/YYYY"}
+
+@pytest.mark.parametrize('option', ['sessions', 'omit_empty'])
+def test_jobs_endpoint_requires_boolean_options(client, option):
+    profile = {'minutes': 4, 'seconds': 30, 'start_date': '01/03/2024'}
+    response = client.post('/jobs', json={'profiles': [profile], option: 'false'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': f"'{option}' should be true or false"}
+
+def test_crashed_worker_is_replaced_and_its_chunk_retried(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), crash_once, processes=1, chunk_size=1, max_in_flight=2)
+    try:
+        options = dict(OPTIONS, marker=str(tmp_path / 'crashed'))
+        first = queue.submit([FAST, FAST], options)
+        assert wait_for(queue, first)['status'] == 'done'
+        second = queue.submit([FAST], options)
+        assert wait_for(queue, second)['status'] == 'done'
+        assert queue.stats()['in_flight'] == 0
+    finally:
+        queue.shutdown()
+
+def test_chunk_that_keeps_crashing_fails_only_its_job(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    queue = JobQueue(path, always_crash, processes=1, chunk_size=1, max_in_flight=1, max_crashes=2)
+    try:
+        status = wait_for(queue, queue.submit([FAST], OPTIONS))
+        assert status['status'] == 'failed' and 'chunk 0' in status['error']
+        assert queue.stats()['in_flight'] == 0
+        queue.worker = app.generate_job_chunk
+        assert wait_for(queue, queue.submit([FAST], OPTIONS))['status'] == 'done'
+    finally:
+        queue.shutdown()
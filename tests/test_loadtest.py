@@ -0,0 +1,71 @@
+import argparse
+import json
+import random
+
+import pytest
+
+import app
+import loadtest
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    path = tmp_path / 'recorded.jsonl'
+    monkeypatch.setattr(app, 'RECORD_REQUESTS', str(path))
+    monkeypatch.setattr(app, 'RECORD_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(app, 'record_file', None)
+    yield path
+    if app.record_file is not None:
+        app.record_file.close()
+
+def test_recorder_keeps_the_raw_body_and_replay_gets_the_same_status(client, recorded):
+    valid = {'minutes': 5, 'seconds': 0, 'start_date': '01/03/2024', 'num_weeks': 4}
+    statuses = [
+        client.post('/calculate', json=valid).status_code,
+        client.post('/calculate', data='{"minutes": 5,', content_type='application/json').status_code,
+        client.post('/calculate', data='minutes=5', content_type='text/plain').status_code,
+        client.get('/calculate?minutes=5&seconds=0&start_date=01/03/2024', headers={'Accept': 'application/x-ndjson'}).status_code,
+        client.get('/cache/stats').status_code,  # fora de RECORDED_ENDPOINTS
+    ]
+    entries = loadtest.load_requests(str(recorded))
+    assert len(entries) == 4
+    assert set(entries[0]) == {'ts', 'method', 'path', 'query', 'accept', 'content_type', 'body'}
+    assert json.loads(entries[0]['body']) == valid
+    assert entries[1]['body'] == '{"minutes": 5,' and entries[1]['content_type'] == 'application/json'
+    assert entries[3]['body'] is None and entries[3]['accept'] == 'application/x-ndjson'
+
+    send = loadtest.in_process_sender()
+    assert [send(entry) for entry in entries] == statuses[:4]
+    assert statuses[1] == 400
+
+def test_recorder_samples_requests(client, recorded, monkeypatch):
+    monkeypatch.setattr(app, 'RECORD_SAMPLE_RATE', 0.5)
+    for value in (0.2, 0.7, 0.4, 0.9):
+        monkeypatch.setattr(random, 'random', lambda value=value: value)
+        client.get('/calculate?minutes=5&seconds=0&start_date=01/03/2024&num_weeks=4')
+    assert len(loadtest.load_requests(str(recorded))) == 2
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert loadtest.percentile(values, 0.50) == 50.0
+    assert loadtest.percentile(values, 0.95) == 95.0
+    assert loadtest.percentile(values, 0.99) == 99.0
+    assert loadtest.percentile([7.0], 0.99) == 7.0
+    assert loadtest.percentile([], 0.5) == 0.0
+
+def result(throughput: float, p95: float, error_rate: float = 0.0) -> dict:
+    return {'throughput_rps': throughput, 'error_rate': error_rate,
+            'latency_ms': {'p50': 10.0, 'p95': p95, 'p99': 50.0}}
+
+@pytest.mark.parametrize('current, exit_code', [
+    (result(100, 20), 0),
+    (result(95, 21), 0),  # dentro dos 10%
+    (result(85, 20), 1),  # vazão caiu
+    (result(100, 25), 1),  # p95 subiu
+    (result(100, 20, error_rate=0.2), 1),
+])
+def test_compare_flags_regressions_beyond_threshold(tmp_path, current, exit_code):
+    baseline_path, current_path = tmp_path / 'before.json', tmp_path / 'after.json'
+    baseline_path.write_text(json.dumps(result(100, 20)))
+    current_path.write_text(json.dumps(current))
+    args = argparse.Namespace(baseline=str(baseline_path), current=str(current_path), threshold=10.0)
+    assert loadtest.compare(args) == exit_code
@@ -0,0 +1,76 @@
+import app
+from plan_store import PlanStore, plan_key
+
+PARAMS = ['v1', 300, '01/03/2024', 8, 10.0, False]
+
+def test_plans_survive_reopen_and_other_versions_are_dropped(tmp_path):
+    path = str(tmp_path / 'plans.sqlite3')
+    key = plan_key(PARAMS)
+    PlanStore(path, '1').put(key, PARAMS, b'{"plan": []}')
+
+    assert PlanStore(path, '1').get(key) == b'{"plan": []}'
+    assert PlanStore(path, '2').get(key) is None
+    assert PlanStore(path, '1').get(key) is None
+
+def test_athlete_plan_returns_latest_or_requested_start_date(tmp_path):
+    store = PlanStore(str(tmp_path / 'plans.sqlite3'), '1')
+    later = PARAMS[:2] + ['08/03/2024'] + PARAMS[3:]
+    store.put(plan_key(PARAMS), PARAMS, b'first')
+    store.put(plan_key(later), later, b'second')
+    store.link('ana', '01/03/2024', plan_key(PARAMS))
+    store.link('ana', '08/03/2024', plan_key(later))
+
+    assert store.athlete_plan('ana') == b'second'
+    assert store.athlete_plan('ana', '01/03/2024') == b'first'
+    assert store.athlete_plan('bia') is None
+    assert store.stats()['plans'] == 2 and store.stats()['athletes'] == 1
+
+def test_calculate_serves_stored_plan(tmp_path, client, monkeypatch):
+    monkeypatch.setenv('PLAN_STORE_DB', str(tmp_path / 'plans.sqlite3'))
+    monkeypatch.setattr(app, 'plan_store', None)
+    query = '/calculate?minutes=5&seconds=0&start_date=1/3/2024&num_weeks=8&base_distance=10&athlete_id=ana'
+
+    first = client.get(query)
+    assert first.status_code == 200
+    assert app.plan_store.stats()['plans'] == 1
+    assert client.get(query.replace('1/3/2024', '01/03/2024')).get_data() == first.get_data()
+    assert app.plan_store.stats()['plans'] == 1
+
+    response = client.get('/athletes/ana/plan?start_date=01/03/2024')
+    assert response.status_code == 200
+    assert response.get_data() == first.get_data()
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['ETag']
+    assert client.get('/athletes/ana/plan?start_date=bad').status_code == 400
+    assert client.get('/athletes/bia/plan').status_code == 404
+
+def test_reimporting_a_linked_plan_keeps_the_athlete_index(tmp_path):
+    store = PlanStore(str(tmp_path / 'plans.sqlite3'), '1')
+    key = plan_key(PARAMS)
+    store.put(key, PARAMS, b'first')
+    store.link('ana', '01/03/2024', key)
+
+    store.put_many([(key, PARAMS, b'second')])
+    assert store.athlete_plan('ana') == b'second'
+    store.put(key, PARAMS, b'third')
+    assert store.athlete_plan('ana') == b'third'
+    assert store.stats()['plans'] == 1 and store.stats()['athletes'] == 1
+    assert store.stats()['bytes'] == len(b'third')
+
+def test_oldest_unlinked_plans_are_evicted_over_max_bytes(tmp_path):
+    path = str(tmp_path / 'plans.sqlite3')
+    store = PlanStore(path, '1', max_bytes=30)
+    keys = [plan_key(PARAMS + [i]) for i in range(4)]
+    store.put(keys[0], PARAMS, b'0' * 10)
+    store.link('ana', '01/03/2024', keys[0])
+    for key in keys[1:]:
+        store.put(key, PARAMS, b'1' * 10)
+
+    assert store.get(keys[0]) is not None  # vinculado: sai por último
+    assert store.get(keys[1]) is None
+    assert store.get(keys[2]) is not None and store.get(keys[3]) is not None
+    assert store.stats()['bytes'] == 30 and store.stats()['evicted'] == 1
+
+    smaller = PlanStore(path, '1', max_bytes=15)
+    assert smaller.stats()['plans'] == 1
+    assert smaller.athlete_plan('ana') == b'0' * 10